@@ -6,8 +6,9 @@ from sqlalchemy.orm import Session
 from database import get_db
 from . import auth_service
 from security import create_access_token
+from utils.content_negotiation import NegotiatedRoute
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=NegotiatedRoute)
 
 @router.post("/login")
 def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
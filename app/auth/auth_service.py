@@ -1,46 +1,85 @@
 # auth/auth_service.py
+from dataclasses import dataclass
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from pydantic import ValidationError
 from jose import JWTError, jwt
+from sqlalchemy.exc import OperationalError
 
-from database import get_db
+from database import DatabaseUnavailable, get_db, is_unavailable_error
+from resilience.stale_cache import StaleCache
 from users import user_repository
 from security import verify_password, SECRET_KEY, ALGORITHM, TokenData
-from users.user_model import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+@dataclass(frozen=True)
+class Principal:
+    """Usuário autenticado pelo token: só o que as verificações de acesso usam."""
+    id: int
+    email: str
+    role_name: str | None
+
+# Último principal bom conhecido por e-mail, usado só com o banco indisponível
+principal_cache = StaleCache(max_entries=10_000)
+
+def forget_principal(email: str) -> None:
+    """Tira o usuário do cache de principals (ex.: ao excluí-lo)."""
+    principal_cache.discard(email)
+
 def authenticate_user(db: Session, email: str, password: str):
     user = user_repository.get_user_by_email(db, email=email)
     if not user or not verify_password(password, user.hashed_password):
         return None
     return user
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"},
-    )
+def get_user_from_token(db: Session, token: str) -> Principal | None:
+    """Valida o token JWT e busca o usuário dono dele. Retorna None se inválido."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         role: str = payload.get("role")
         if email is None or role is None:
-            raise credentials_exception
+            return None
         token_data = TokenData(email=email, role=role)
     except (JWTError, ValidationError):
-        raise credentials_exception
+        return None
+    try:
+        row = user_repository.get_principal_by_email(db, email=token_data.email)
+    except (DatabaseUnavailable, OperationalError) as e:
+        if isinstance(e, OperationalError) and not is_unavailable_error(e):
+            raise
+        # Banco fora: o token já foi validado acima, então serve o último
+        # principal conhecido (se houver) em vez de derrubar todas as rotas
+        db.rollback()
+        cached = principal_cache.get(token_data.email)
+        if cached is None:
+            raise
+        return cached[0]
+    if row is None:
+        return None
+    principal = Principal(id=row.id, email=row.email, role_name=row.role_name)
+    principal_cache.put(principal.email, principal)
+    return principal
 
-    user = user_repository.get_user_by_email(db, email=token_data.email)
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = get_user_from_token(db, token)
     if user is None:
         raise credentials_exception
     return user
 
+def has_role(user: Principal | None, role_name: str) -> bool:
+    return user is not None and user.role_name == role_name
+
 def require_role(required_role_name: str):
-    def role_checker(current_user: User = Depends(get_current_user)):
-        if not current_user.role or current_user.role.name != required_role_name:
+    def role_checker(current_user: Principal = Depends(get_current_user)):
+        if not has_role(current_user, required_role_name):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Operation not permitted for this user role"
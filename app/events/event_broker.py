@@ -0,0 +1,109 @@
+# events/event_broker.py
+import asyncio
+import threading
+from collections import deque
+
+from .event_model import ChangeEvent
+
+
+class Subscription:
+    """
+    Fila de eventos de uma conexão SSE.
+
+    A fila é limitada: se o cliente não consumir rápido o bastante e ela
+    encher, a assinatura é encerrada (sentinela None) em vez de acumular
+    memória. O cliente reconecta com Last-Event-ID e recebe o que perdeu
+    a partir do buffer de replay.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue: asyncio.Queue[ChangeEvent | None] = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def offer(self, event: ChangeEvent) -> None:
+        """Executa no event loop da conexão."""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventBroker:
+    """
+    Distribui eventos de mudança para as conexões SSE deste processo.
+
+    Guarda os últimos `replay_size` eventos para retomada via Last-Event-ID.
+    `floor` é a versão a partir da qual o buffer está completo: quem pedir
+    retomada de uma versão anterior precisa recarregar os dados (reset).
+    `publish` pode ser chamado de qualquer thread.
+
+    O ID dos eventos é a versão (change_version_seq). As versões ficam
+    visíveis na ordem dos commits (ver `event_repository.lock_change_versions`)
+    e os eventos chegam nessa mesma ordem (NOTIFY, ou a entrega local
+    serializada em `event_service`), então o buffer está em ordem de versão e
+    "tudo depois de N" é exatamente o que um cliente com Last-Event-ID N perdeu.
+    """
+
+    def __init__(self, replay_size: int = 1000, max_queue: int = 100):
+        self.max_queue = max_queue
+        self.floor: int | None = None
+        # True enquanto o LISTEN do PostgreSQL estiver ativo: os eventos chegam
+        # por ele (de todos os workers) e não precisam ser entregues localmente
+        self.listening = False
+        self._replay: deque[ChangeEvent] = deque(maxlen=replay_size)
+        self._replay_versions: set[int] = set()
+        self._subscriptions: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event: ChangeEvent) -> None:
+        with self._lock:
+            # Um mesmo evento pode chegar duas vezes (entrega local e NOTIFY)
+            # enquanto o LISTEN está sendo estabelecido
+            if event.version in self._replay_versions:
+                return
+            if len(self._replay) == self._replay.maxlen:
+                evicted = self._replay.popleft()
+                self._replay_versions.discard(evicted.version)
+                self.floor = evicted.version
+            self._replay.append(event)
+            self._replay_versions.add(event.version)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.offer, event)
+
+    def reset_floor(self, version: int) -> None:
+        """Descarta o buffer (ex.: após perder a conexão do LISTEN) a partir de `version`."""
+        with self._lock:
+            self._replay.clear()
+            self._replay_versions.clear()
+            self.floor = version
+
+    def can_replay(self, version: int) -> bool:
+        """Indica se o buffer ainda tem todos os eventos posteriores a `version`."""
+        return self.floor is None or version >= self.floor
+
+    def replay_since(self, version: int) -> list[ChangeEvent] | None:
+        """Eventos posteriores a `version`, ou None se não for possível garantir a sequência."""
+        with self._lock:
+            if not self.can_replay(version):
+                return None
+            return [event for event in self._replay if event.version > version]
+
+
+broker = EventBroker()
@@ -0,0 +1,83 @@
+# events/event_controller.py
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from database import get_db
+from auth.auth_service import get_current_user
+from .event_broker import broker
+from .event_model import ChangeEvent
+
+router = APIRouter(tags=["Events"])
+
+HEARTBEAT_SECONDS = 15
+
+
+def _format_event(change: ChangeEvent) -> str:
+    return f"id: {change.version}\nevent: change\ndata: {change.model_dump_json()}\n\n"
+
+
+def _format_reset() -> str:
+    # O buffer andou entre a verificação em stream_events e a assinatura:
+    # o cliente perdeu eventos e deve recarregar as listas
+    return 'event: reset\ndata: {"reason": "replay unavailable"}\n\n'
+
+
+async def _event_stream(request: Request, last_event_id: int | None):
+    subscription = broker.subscribe()
+    try:
+        sent = set()
+        if last_event_id is not None:
+            missed = broker.replay_since(last_event_id)
+            if missed is None:
+                yield _format_reset()
+            else:
+                for change in missed:
+                    sent.add(change.version)
+                    yield _format_event(change)
+
+        while not await request.is_disconnected():
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comentário SSE: mantém a conexão viva em proxies e detecta clientes desconectados
+                yield ": keepalive\n\n"
+                continue
+            if change is None:
+                # Fila cheia (cliente lento): encerra, o cliente retoma com Last-Event-ID
+                break
+            if change.version in sent:
+                continue
+            yield _format_event(change)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@router.get("/events", dependencies=[Depends(get_current_user)])
+def stream_events(
+    request: Request,
+    db: Session = Depends(get_db),
+    last_event_id: int | None = Header(default=None),
+):
+    """
+    Stream SSE com as mudanças em usuários e perfis (criação, edição e exclusão).
+
+    Cada evento traz entity, id, op e version; o `id` do evento SSE é a versão,
+    então reconectar com Last-Event-ID retoma de onde o cliente parou. Se os
+    eventos posteriores ao Last-Event-ID não estão mais no buffer, responde 410:
+    o cliente sincroniza por /users/changes e /roles/changes e reconecta sem ele.
+    """
+    # A sessão só foi usada para autenticar: libera a conexão antes do stream longo
+    db.close()
+    if last_event_id is not None and not broker.can_replay(last_event_id):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Events after Last-Event-ID are no longer available; resync and reconnect without it",
+        )
+    return StreamingResponse(
+        _event_stream(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,16 @@
+# events/event_model.py
+from sqlalchemy import Sequence
+from pydantic import BaseModel
+from database import Base
+
+# Sequência global de versões das mudanças (usuários e perfis). É criada junto
+# com as tabelas e serve de ID dos eventos do feed, permitindo retomar o stream
+# a partir do último evento recebido (Last-Event-ID).
+change_version_seq = Sequence("change_version_seq", metadata=Base.metadata)
+
+# Schema Pydantic de uma notificação de mudança
+class ChangeEvent(BaseModel):
+    entity: str   # "user" ou "role"
+    id: int       # ID do registro alterado
+    op: str       # "create", "update" ou "delete"
+    version: int  # valor de change_version_seq
@@ -0,0 +1,55 @@
+# events/event_repository.py
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Chave do advisory lock que serializa a atribuição de versões (ver lock_change_versions)
+CHANGE_VERSION_LOCK_KEY = 0x63686776
+
+# Tabela de cada entidade do feed com coluna `version`
+VERSIONED_TABLES = {"user": "users", "role": "roles"}
+
+def lock_change_versions(db: Session) -> None:
+    """
+    Espera a vez de reservar versões e segura o lock até o fim da transação.
+
+    Com só uma transação por vez reservando valores de change_version_seq,
+    as versões ficam visíveis (commit) na mesma ordem em que foram atribuídas:
+    quem já leu a versão N não perde uma N-1 que ainda estivesse em andamento.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_VERSION_LOCK_KEY})
+
+def stamp_versions(db: Session, entity: str, ids: list[int]) -> dict[int, int]:
+    """Atribui uma nova versão a cada registro de `ids`. Retorna {id: versão}."""
+    rows = db.execute(
+        text(f"UPDATE {VERSIONED_TABLES[entity]} SET version = nextval('change_version_seq') "
+             "WHERE id = ANY(:ids) RETURNING id, version"),
+        {"ids": ids},
+    )
+    return dict(rows.all())
+
+def stamp_tombstone_versions(db: Session, entity: str, versions: list[int]) -> dict[int, int]:
+    """
+    Atribui uma nova versão aos tombstones da entidade com as versões informadas.
+    Retorna {id do registro excluído: versão}.
+    """
+    rows = db.execute(
+        text("UPDATE tombstones SET version = nextval('change_version_seq') "
+             "WHERE entity = :entity AND version = ANY(:versions) RETURNING entity_id, version"),
+        {"entity": entity, "versions": versions},
+    )
+    return dict(rows.all())
+
+def current_version(db: Session) -> int:
+    """Última versão já reservada (0 se a sequência nunca foi usada)."""
+    last_value, is_called = db.execute(text("SELECT last_value, is_called FROM change_version_seq")).one()
+    return last_value if is_called else 0
+
+def publish(db: Session, channel: str, payloads: list[str]) -> None:
+    """
+    Envia as notificações com pg_notify; o PostgreSQL só as entrega no COMMIT.
+    Todas vão em um único comando, mesmo nas operações em lote.
+    """
+    db.execute(
+        text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+        {"channel": channel, "payloads": payloads},
+    )
@@ -0,0 +1,168 @@
+# events/event_service.py
+import json
+import logging
+import select
+import threading
+
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from database import SessionLocal, get_engine, use_primary
+from . import event_repository
+from .event_broker import broker
+from .event_model import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "change_events"
+_PENDING_KEY = "pending_change_events"
+_DELIVERING_KEY = "delivering_change_events"
+
+# Segura do before_commit ao after_commit das transações com eventos, para que
+# a entrega local ao broker siga a ordem dos commits (e portanto das versões)
+_delivery_lock = threading.Lock()
+
+
+@event.listens_for(SessionLocal, "after_transaction_end")
+def _release_after_failed_commit(session: Session, transaction):
+    # Commit que falhou depois do before_commit
+    if transaction.parent is None:
+        _release_delivery(session)
+
+
+def notify_change(db: Session, entity: str, entity_id: int, op: str, version: int) -> ChangeEvent:
+    """
+    Registra uma mudança para o feed de eventos.
+
+    `version` é a versão gravada na linha (ou no tombstone, para exclusões).
+    Deve ser chamada dentro da mesma transação da escrita (ver
+    `database.unit_of_work`): a notificação só é enviada se o commit acontecer.
+    A versão gravada durante a transação é provisória: a definitiva é
+    atribuída no commit (ver `_stamp_versions`), no registro e no evento.
+    """
+    change = ChangeEvent(entity=entity, id=entity_id, op=op, version=version)
+    db.info.setdefault(_PENDING_KEY, []).append(change)
+    return change
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _send_pending(session: Session):
+    pending = session.info.get(_PENDING_KEY)
+    if not pending:
+        return
+    if session.get_bind().dialect.name == "postgresql":
+        _stamp_versions(session, pending)
+        event_repository.publish(session, CHANNEL, [change.model_dump_json() for change in pending])
+    _delivery_lock.acquire()
+    session.info[_DELIVERING_KEY] = True
+
+
+def _stamp_versions(session: Session, pending: list[ChangeEvent]) -> None:
+    """
+    Atribui as versões definitivas das mudanças da transação, logo antes do commit.
+
+    Só aqui a transação pede o lock de versões, que segue até o commit: cada
+    registro alterado (ou tombstone) recebe um novo valor de change_version_seq,
+    e as versões ficam visíveis na ordem dos commits. O resto da transação
+    (INSERT da imagem, travas de linhas, validações) corre em paralelo com as outras.
+    """
+    event_repository.lock_change_versions(session)
+    stamped = {}
+    for entity in {change.entity for change in pending}:
+        changed = [change.id for change in pending if change.entity == entity and change.op != "delete"]
+        deleted = [change.version for change in pending if change.entity == entity and change.op == "delete"]
+        if changed:
+            for entity_id, version in event_repository.stamp_versions(session, entity, changed).items():
+                stamped[entity, entity_id, False] = version
+        if deleted:
+            for entity_id, version in event_repository.stamp_tombstone_versions(session, entity, deleted).items():
+                stamped[entity, entity_id, True] = version
+    for change in pending:
+        change.version = stamped.get((change.entity, change.id, change.op == "delete"), change.version)
+    pending.sort(key=lambda change: change.version)
+
+    # Os objetos já carregados na sessão (devolvidos pela API) ficam com a versão definitiva
+    entities = {table: entity for entity, table in event_repository.VERSIONED_TABLES.items()}
+    for obj in list(session.identity_map.values()):
+        state = sa_inspect(obj)
+        entity = entities.get(state.mapper.local_table.name)
+        version = stamped.get((entity, state.identity[0], False)) if entity else None
+        if version is not None:
+            set_committed_value(obj, "version", version)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _deliver_locally(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    try:
+        # Com o LISTEN ativo os eventos voltam pelo PostgreSQL para todos os workers
+        if pending and not broker.listening:
+            for change in pending:
+                broker.publish(change)
+    finally:
+        _release_delivery(session)
+
+
+def _release_delivery(session: Session):
+    if session.info.pop(_DELIVERING_KEY, False):
+        _delivery_lock.release()
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+class ChangeListener(threading.Thread):
+    """
+    Escuta o canal `change_events` (LISTEN/NOTIFY) e repassa para o broker.
+
+    Assim um evento gravado em qualquer worker (ou instância) chega a todas
+    as conexões SSE. Se a conexão cair, o buffer de replay é descartado,
+    pois eventos podem ter sido perdidos no intervalo, e a thread reconecta.
+    """
+
+    def __init__(self, poll_interval: float = 1.0, retry_interval: float = 5.0):
+        super().__init__(name="change-listener", daemon=True)
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Falha no LISTEN de %s; reconectando", CHANNEL)
+            finally:
+                broker.listening = False
+            self._stop_event.wait(self.retry_interval)
+
+    def _listen(self):
+        engine = get_engine()
+        connection = engine.raw_connection()
+        try:
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            with use_primary(SessionLocal()) as db:
+                broker.reset_floor(event_repository.current_version(db))
+            broker.listening = True
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([dbapi_connection], [], [], self.poll_interval)
+                if not readable:
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notification = dbapi_connection.notifies.pop(0)
+                    broker.publish(ChangeEvent(**json.loads(notification.payload)))
+        finally:
+            # A conexão ficou em modo LISTEN/autocommit: descarta em vez de devolver ao pool
+            connection.invalidate()
+            connection.close()
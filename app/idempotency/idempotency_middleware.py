@@ -0,0 +1,104 @@
+# idempotency/idempotency_middleware.py
+import hashlib
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from .idempotency_store import StoredResponse
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def _sha256(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Suporte ao cabeçalho Idempotency-Key nas rotas de escrita.
+
+    A primeira requisição com uma chave é executada normalmente e sua resposta
+    fica registrada no `store`. Repetições com a mesma chave (e o mesmo corpo)
+    recebem a resposta registrada sem refazer bcrypt, PIL ou o INSERT.
+    A chave vale apenas para o mesmo cabeçalho Authorization.
+    """
+
+    def __init__(self, app, store, methods=("POST", "PUT"), path_prefixes=("/users", "/roles")):
+        super().__init__(app)
+        self.store = store
+        self.methods = set(methods)
+        self.path_prefixes = tuple(path_prefixes)
+
+    async def dispatch(self, request: Request, call_next):
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if (idempotency_key is None
+                or request.method not in self.methods
+                or not request.url.path.startswith(self.path_prefixes)):
+            return await call_next(request)
+
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": f"Invalid {IDEMPOTENCY_HEADER} header"},
+            )
+
+        body = await request.body()
+        key = _sha256(request.headers.get("authorization", "").encode(), idempotency_key.encode())
+        # O Accept entra na impressão: a resposta gravada tem o formato negociado
+        fingerprint = _sha256(request.method.encode(), request.url.path.encode(),
+                              request.url.query.encode(), request.headers.get("accept", "").encode(), body)
+
+        existing = await run_in_threadpool(self.store.begin, key, fingerprint)
+        if existing is not None:
+            return self._replay(existing, fingerprint)
+
+        try:
+            response = await call_next(request)
+            response_body = b"".join([chunk async for chunk in response.body_iterator])
+        except BaseException:
+            await run_in_threadpool(self.store.discard, key)
+            raise
+
+        if response.status_code < 500:
+            stored = StoredResponse(
+                fingerprint=fingerprint,
+                status_code=response.status_code,
+                content_type=response.headers.get("content-type"),
+                body=response_body,
+            )
+            await run_in_threadpool(self.store.complete, key, stored)
+        else:
+            # Falhas do servidor não são registradas: o cliente pode tentar de novo
+            await run_in_threadpool(self.store.discard, key)
+
+        replayed = Response(content=response_body, status_code=response.status_code)
+        # Lista crua: cabeçalhos repetidos (vários Set-Cookie) chegam todos ao cliente
+        replayed.raw_headers = list(response.raw_headers)
+        return replayed
+
+    @staticmethod
+    def _replay(existing: StoredResponse, fingerprint: str) -> Response:
+        if existing.fingerprint != fingerprint:
+            return JSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                content={"detail": f"{IDEMPOTENCY_HEADER} already used with a different request"},
+            )
+        if existing.in_progress:
+            return JSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={"detail": "A request with this Idempotency-Key is still being processed"},
+                headers={"Retry-After": "1"},
+            )
+        return Response(
+            content=existing.body,
+            status_code=existing.status_code,
+            media_type=existing.content_type,
+            headers={"Idempotent-Replayed": "true"},
+        )
@@ -0,0 +1,17 @@
+# idempotency/idempotency_model.py
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String
+from database import Base
+
+# Modelo da Tabela SQLAlchemy
+# Guarda a resposta de cada requisição com Idempotency-Key. Enquanto a
+# requisição original está em andamento, status_code fica nulo.
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = {'extend_existing': True}
+
+    key = Column(String(64), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,153 @@
+# idempotency/idempotency_store.py
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from database import SessionLocal, get_engine, use_primary
+from .idempotency_model import IdempotencyKey
+
+
+@dataclass
+class StoredResponse:
+    """Resposta registrada para uma Idempotency-Key (status_code None = em andamento)."""
+    fingerprint: str
+    status_code: int | None = None
+    content_type: str | None = None
+    body: bytes | None = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self.status_code is None
+
+
+class MemoryIdempotencyStore:
+    """
+    LRU em memória com TTL, para instalações de um único nó.
+
+    `begin` reserva a chave de forma atômica: devolve None quando a chamada
+    atual é a dona da chave, ou o registro existente (concluído ou em andamento).
+    Uma reserva em andamento há mais de `lease_seconds` é considerada abandonada
+    e pode ser assumida por uma nova tentativa.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, lease_seconds: int = 60):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lease_seconds = lease_seconds
+        self._entries: OrderedDict[str, tuple[float, StoredResponse]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str) -> StoredResponse | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < (
+                    self.lease_seconds if entry[1].in_progress else self.ttl_seconds):
+                self._entries.move_to_end(key)
+                return entry[1]
+            self._entries[key] = (now, StoredResponse(fingerprint=fingerprint))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return None
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DatabaseIdempotencyStore:
+    """
+    Registros na tabela `idempotency_keys`, compartilhados entre workers.
+
+    A reserva usa INSERT ... ON CONFLICT DO NOTHING, então duas réplicas
+    nunca executam a mesma chave ao mesmo tempo. Uma reserva em andamento há
+    mais de `lease_seconds` (ex.: o processo caiu no meio da requisição) é
+    apagada e assumida pela próxima tentativa. Registros expirados e o
+    excesso acima de `max_entries` são removidos a cada `prune_every` gravações.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, lease_seconds: int = 60, prune_every: int = 100):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lease_seconds = lease_seconds
+        self.prune_every = prune_every
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _session(self):
+        # Reserva, leitura e gravação da resposta são ler-e-escrever: uma
+        # réplica atrasada não veria a reserva recém-criada
+        get_engine()
+        return use_primary(SessionLocal())
+
+    def begin(self, key: str, fingerprint: str) -> StoredResponse | None:
+        now = datetime.now(timezone.utc)
+        expired_before = now - timedelta(seconds=self.ttl_seconds)
+        abandoned_before = now - timedelta(seconds=self.lease_seconds)
+        with self._session() as db:
+            db.execute(delete(IdempotencyKey).where(
+                IdempotencyKey.key == key,
+                or_(IdempotencyKey.created_at < expired_before,
+                    and_(IdempotencyKey.status_code.is_(None), IdempotencyKey.created_at < abandoned_before)),
+            ))
+            inserted = db.execute(
+                insert(IdempotencyKey)
+                .values(key=key, fingerprint=fingerprint, created_at=now)
+                .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+                .returning(IdempotencyKey.key)
+            ).first()
+            db.commit()
+            if inserted is not None:
+                return None
+            row = db.get(IdempotencyKey, key)
+            if row is None:
+                # A chave foi descartada entre o INSERT e a leitura: trata como em andamento
+                return StoredResponse(fingerprint=fingerprint)
+            return StoredResponse(row.fingerprint, row.status_code, row.content_type, row.body)
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        with self._session() as db:
+            row = db.get(IdempotencyKey, key)
+            if row is not None:
+                row.status_code = response.status_code
+                row.content_type = response.content_type
+                row.body = response.body
+                db.commit()
+        self._maybe_prune()
+
+    def discard(self, key: str) -> None:
+        with self._session() as db:
+            db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+            db.commit()
+
+    def _maybe_prune(self) -> None:
+        with self._lock:
+            self._writes += 1
+            if self._writes % self.prune_every:
+                return
+        expired_before = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+        newest = (select(IdempotencyKey.key)
+                  .order_by(IdempotencyKey.created_at.desc())
+                  .limit(self.max_entries))
+        with self._session() as db:
+            db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < expired_before))
+            db.execute(delete(IdempotencyKey).where(IdempotencyKey.key.not_in(newest)))
+            db.commit()
+
+
+def create_store(settings):
+    """Escolhe o armazenamento de acordo com `settings.idempotency_backend`."""
+    args = (settings.idempotency_ttl_seconds, settings.idempotency_max_entries, settings.idempotency_lease_seconds)
+    if settings.idempotency_backend == "database":
+        return DatabaseIdempotencyStore(*args)
+    return MemoryIdempotencyStore(*args)
@@ -0,0 +1,38 @@
+# images/image_job_model.py
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, Index
+from pydantic import BaseModel
+from database import Base
+
+# Estados de um job de imagem
+QUEUED = "queued"          # aguardando (ou aguardando nova tentativa em run_after)
+RUNNING = "running"        # reservado por um worker até locked_until
+DONE = "done"
+DEAD = "dead"              # desistência (dead-letter): erro permanente ou tentativas esgotadas
+SUPERSEDED = "superseded"  # substituído por um upload mais novo do mesmo usuário
+
+# Modelo da Tabela SQLAlchemy
+# Fila persistente de processamento de imagens de perfil, consumida pelos
+# workers com SELECT ... FOR UPDATE SKIP LOCKED.
+class ImageJob(Base):
+    __tablename__ = "image_jobs"
+    __table_args__ = (
+        Index("ix_image_jobs_status_run_after", "status", "run_after"),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    payload = Column(Text, nullable=True)    # Data URL enviado pelo cliente (None depois de encerrado)
+    status = Column(String, nullable=False, default=QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+# Schema Pydantic da consulta de status
+class ImageStatus(BaseModel):
+    user_id: int
+    image_status: str               # none, pending, ready ou failed
+    attempts: int = 0
+    last_error: str | None = None
@@ -0,0 +1,109 @@
+# images/image_job_repository.py
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import image_job_model
+from .image_job_model import ImageJob
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def supersede_pending(db: Session, user_id: int) -> None:
+    """
+    Descarta os jobs do usuário que ainda não terminaram, inclusive os que
+    um worker está processando: o resultado deles não é mais gravado (ver `finish`).
+    """
+    db.execute(
+        update(ImageJob)
+        .where(ImageJob.user_id == user_id,
+               ImageJob.status.in_([image_job_model.QUEUED, image_job_model.RUNNING]))
+        .values(status=image_job_model.SUPERSEDED, locked_until=None, payload=None)
+    )
+
+def enqueue(db: Session, user_id: int, payload: str) -> int:
+    """
+    Enfileira o processamento de uma imagem e descarta os jobs ainda não
+    terminados do mesmo usuário (só a imagem mais recente interessa).
+    """
+    supersede_pending(db, user_id)
+    now = _now()
+    return db.scalar(
+        insert(ImageJob)
+        .values(user_id=user_id, payload=payload, status=image_job_model.QUEUED,
+                attempts=0, run_after=now, created_at=now)
+        .returning(ImageJob.id)
+    )
+
+def claim_next(db: Session, lease_seconds: int, max_attempts: int = 5) -> ImageJob | None:
+    """
+    Reserva o próximo job disponível para este worker.
+
+    FOR UPDATE SKIP LOCKED faz workers concorrentes pegarem jobs diferentes
+    sem esperar uns pelos outros. A reserva vale até `locked_until`: se o
+    worker morrer no meio, o job volta a ficar disponível depois disso.
+    Se isso acontecer na última tentativa (ex.: a imagem derruba o worker),
+    o job é devolvido já como dead, sem ser executado de novo.
+    """
+    now = _now()
+    job = db.scalars(
+        select(ImageJob)
+        .where(or_(
+            and_(ImageJob.status == image_job_model.QUEUED, ImageJob.run_after <= now),
+            and_(ImageJob.status == image_job_model.RUNNING, ImageJob.locked_until < now),
+        ))
+        .order_by(ImageJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    if job is None:
+        return None
+    if job.status == image_job_model.RUNNING and job.attempts >= max_attempts:
+        job.status = image_job_model.DEAD
+        job.last_error = "Tentativas esgotadas: o worker não concluiu o job"
+        job.locked_until = None
+        job.payload = None
+        return job
+    job.status = image_job_model.RUNNING
+    job.attempts += 1
+    job.locked_until = now + timedelta(seconds=lease_seconds)
+    return job
+
+def _holds_lease(job: ImageJob):
+    """O job ainda está com este worker: em andamento e com a mesma reserva."""
+    return and_(ImageJob.id == job.id,
+                ImageJob.status == image_job_model.RUNNING,
+                ImageJob.locked_until == job.locked_until)
+
+def finish(db: Session, job: ImageJob, status: str, error: str | None = None) -> bool:
+    """
+    Encerra o job reservado por `claim_next` e descarta a imagem enviada (o
+    resultado fica no usuário). Retorna False (e não altera nada) se a
+    reserva foi perdida: o job foi substituído ou outro worker o assumiu
+    depois de `locked_until`.
+    """
+    result = db.execute(
+        update(ImageJob)
+        .where(_holds_lease(job))
+        .values(status=status, last_error=error, locked_until=None, payload=None)
+    )
+    return result.rowcount == 1
+
+def retry_later(db: Session, job: ImageJob, delay_seconds: float, error: str) -> bool:
+    """Devolve o job à fila para uma nova tentativa; como `finish`, exige a reserva."""
+    result = db.execute(
+        update(ImageJob)
+        .where(_holds_lease(job))
+        .values(status=image_job_model.QUEUED, last_error=error, locked_until=None,
+                run_after=_now() + timedelta(seconds=delay_seconds))
+    )
+    return result.rowcount == 1
+
+def get_latest_job(db: Session, user_id: int) -> ImageJob | None:
+    return db.scalars(
+        select(ImageJob)
+        .where(ImageJob.user_id == user_id)
+        .order_by(ImageJob.id.desc())
+        .limit(1)
+    ).first()
@@ -0,0 +1,117 @@
+# images/image_worker.py
+import logging
+import threading
+
+from database import SessionLocal, get_engine, unit_of_work, use_primary
+from events.event_service import notify_change
+from observability.memory_stats import memory_stats
+from users import user_repository, user_model
+from utils.image_processor import process_image_base64
+from . import image_job_model, image_job_repository
+
+logger = logging.getLogger(__name__)
+
+
+def _set_user_image(db, user_id: int, image_status: str, image: str | None = None):
+    """Grava o resultado no usuário, se ele ainda espera uma imagem processada."""
+    if user_repository.get_user_image_status(db, user_id) != "pending":
+        return
+    user_in = user_model.UserUpdate(profile_image_base64=image) if image else user_model.UserUpdate()
+    db_user = user_repository.update_user(db=db, user_id=user_id, user_in=user_in, image_status=image_status)
+    if db_user is not None:
+        notify_change(db, "user", db_user.id, "update", db_user.version)
+
+
+def _finish(db, job, status: str, image_status: str, image: str | None = None, error: str | None = None):
+    """
+    Encerra o job e grava o resultado no usuário.
+
+    Nada é gravado se o job perdeu a reserva (foi substituído por outro envio,
+    a imagem foi removida ou outro worker o assumiu) ou se o usuário não
+    espera mais uma imagem processada.
+    """
+    if not image_job_repository.finish(db, job, status, error):
+        logger.info("Job de imagem %s perdeu a reserva; resultado descartado", job.id)
+        return
+    _set_user_image(db, job.user_id, image_status, image)
+
+
+def process_next_job(lease_seconds: int = 60, max_attempts: int = 5, backoff_seconds: float = 5) -> bool:
+    """
+    Processa um job da fila. Retorna False se não havia job disponível.
+
+    A conversão da imagem roda fora de qualquer transação. Imagem inválida
+    (ValueError) é erro permanente: o job vai direto para dead e o usuário
+    fica com image_status "failed". Outros erros, e reservas que expiraram
+    (o worker caiu no meio), são tentados de novo com espera exponencial até
+    `max_attempts`.
+    """
+    get_engine()
+    with use_primary(SessionLocal()) as db:
+        with unit_of_work(db):
+            job = image_job_repository.claim_next(db, lease_seconds, max_attempts)
+        if job is None:
+            return False
+
+    if job.status == image_job_model.DEAD:
+        logger.warning("Job de imagem %s abandonado após %s tentativas", job.id, job.attempts)
+        with use_primary(SessionLocal()) as db, unit_of_work(db):
+            # Um envio mais novo do usuário tem o próprio job: não marca falha
+            latest = image_job_repository.get_latest_job(db, job.user_id)
+            if latest is not None and latest.id == job.id:
+                _set_user_image(db, job.user_id, "failed")
+        return True
+
+    try:
+        with memory_stats.measure("image_job"):
+            processed = process_image_base64(job.payload)
+    except ValueError as e:
+        logger.warning("Imagem do usuário %s rejeitada (job %s): %s", job.user_id, job.id, e)
+        with use_primary(SessionLocal()) as db, unit_of_work(db):
+            _finish(db, job, image_job_model.DEAD, "failed", error=str(e))
+        return True
+    except Exception as e:
+        logger.exception("Falha no job de imagem %s (tentativa %s)", job.id, job.attempts)
+        with use_primary(SessionLocal()) as db, unit_of_work(db):
+            if job.attempts >= max_attempts:
+                _finish(db, job, image_job_model.DEAD, "failed", error=repr(e))
+            else:
+                delay = backoff_seconds * 2 ** (job.attempts - 1)
+                if not image_job_repository.retry_later(db, job, delay, repr(e)):
+                    logger.info("Job de imagem %s perdeu a reserva; nova tentativa descartada", job.id)
+        return True
+
+    with use_primary(SessionLocal()) as db, unit_of_work(db):
+        _finish(db, job, image_job_model.DONE, "ready", image=processed)
+    return True
+
+
+class ImageWorker(threading.Thread):
+    """
+    Consome a fila de imagens até `stop()`.
+
+    Roda dentro da API (thread iniciada no lifespan) ou sozinho, pelo
+    `worker.py`. Vários workers podem rodar ao mesmo tempo.
+    """
+
+    def __init__(self, poll_interval: float = 1.0, lease_seconds: int = 60,
+                 max_attempts: int = 5, backoff_seconds: float = 5):
+        super().__init__(name="image-worker", daemon=True)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                worked = process_next_job(self.lease_seconds, self.max_attempts, self.backoff_seconds)
+            except Exception:
+                logger.exception("Erro no worker de imagens")
+                worked = False
+            if not worked:
+                self._stop_event.wait(self.poll_interval)
@@ -0,0 +1,189 @@
+# observability/memory_stats.py
+import gc
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from starlette.routing import Match
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> int | None:
+    """RSS atual do processo (Linux, via /proc); None em outros sistemas."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def max_rss_bytes() -> int:
+    """Maior RSS já atingido pelo processo."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KiB no Linux e em bytes no macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+@dataclass
+class TagStats:
+    count: int = 0
+    total_peak_bytes: int = 0
+    max_peak_bytes: int = 0
+    last_peak_bytes: int = 0
+
+    def as_dict(self, tag: str) -> dict:
+        return {
+            "tag": tag,
+            "count": self.count,
+            "mean_peak_bytes": self.total_peak_bytes // self.count if self.count else 0,
+            "max_peak_bytes": self.max_peak_bytes,
+            "last_peak_bytes": self.last_peak_bytes,
+        }
+
+
+class MemoryStats:
+    """
+    Pico de alocação (tracemalloc) durante as rotas marcadas ou tarefas
+    (ex.: jobs de imagem).
+
+    O pico do tracemalloc é do processo inteiro: o valor registrado inclui o
+    que outras threads (requisições não medidas, o worker de imagens)
+    alocaram no mesmo intervalo, então é um limite superior do pico da
+    requisição, exato só com o processo ocioso. Como `measure` zera esse pico,
+    só uma medição acontece por vez; as que chegam enquanto outra está em
+    andamento rodam normalmente e entram em `skipped`.
+    Sem o tracemalloc ligado (`start`), `measure` não faz nada.
+    """
+
+    def __init__(self):
+        self._stats: dict[str, TagStats] = {}
+        self._skipped: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._measuring = threading.Lock()
+        self._baseline: tracemalloc.Snapshot | None = None
+
+    def start(self, frames: int = 1) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self) -> None:
+        self._baseline = None
+        tracemalloc.stop()
+
+    @contextmanager
+    def measure(self, tag: str):
+        """Mede o pico de memória alocada pelo processo durante o bloco e registra em `tag`."""
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        if not self._measuring.acquire(blocking=False):
+            with self._lock:
+                self._skipped[tag] = self._skipped.get(tag, 0) + 1
+            yield
+            return
+        try:
+            start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            try:
+                yield
+            finally:
+                _, peak = tracemalloc.get_traced_memory()
+                self.record(tag, max(peak - start, 0))
+        finally:
+            self._measuring.release()
+
+    def record(self, tag: str, peak_bytes: int) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(tag, TagStats())
+            stats.count += 1
+            stats.total_peak_bytes += peak_bytes
+            stats.max_peak_bytes = max(stats.max_peak_bytes, peak_bytes)
+            stats.last_peak_bytes = peak_bytes
+
+    def tags(self) -> list[dict]:
+        with self._lock:
+            rows = [dict(stats.as_dict(tag), skipped=self._skipped.get(tag, 0))
+                    for tag, stats in self._stats.items()]
+        return sorted(rows, key=lambda row: row["max_peak_bytes"], reverse=True)
+
+    def gauges(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "rss_bytes": rss_bytes(),
+            "max_rss_bytes": max_rss_bytes(),
+            "tracing": tracing,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "gc_objects": len(gc.get_objects()),
+        }
+
+    def take_snapshot(self) -> None:
+        """Guarda o estado atual das alocações como base para `diff`."""
+        self._baseline = tracemalloc.take_snapshot()
+
+    def diff(self, limit: int = 20) -> list[dict] | None:
+        """
+        Locais de alocação que mais cresceram desde `take_snapshot`
+        (None se não houver snapshot base).
+        """
+        if self._baseline is None:
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        differences = snapshot.filter_traces(filters).compare_to(self._baseline.filter_traces(filters), "lineno")
+        return [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_bytes": stat.size,
+                "size_diff_bytes": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in differences[:limit]
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._skipped.clear()
+
+
+memory_stats = MemoryStats()
+
+
+class MemoryTrackingMiddleware:
+    """
+    Middleware ASGI que mede o pico de memória das rotas marcadas
+    (pelo nome da rota, ex.: "read_users"), incluindo a serialização da resposta.
+    """
+
+    def __init__(self, app, tracked_routes: list[str], stats: MemoryStats = memory_stats):
+        self.app = app
+        self.tracked_routes = set(tracked_routes)
+        self.stats = stats
+
+    def _tag_for(self, scope) -> str | None:
+        for route in scope["app"].router.routes:
+            if getattr(route, "name", None) not in self.tracked_routes:
+                continue
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return f"{scope['method']} {route.path}"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracemalloc.is_tracing():
+            await self.app(scope, receive, send)
+            return
+        tag = self._tag_for(scope)
+        if tag is None:
+            await self.app(scope, receive, send)
+            return
+        with self.stats.measure(tag):
+            await self.app(scope, receive, send)
@@ -0,0 +1,69 @@
+# observability/observability_controller.py
+import tracemalloc
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from auth.auth_service import require_role
+from resilience.single_flight import single_flight_stats
+from .memory_stats import memory_stats
+from .query_stats import query_stats
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_role("admin"))]
+)
+
+@router.get("/queries")
+def list_query_fingerprints(
+    limit: int = Query(20, ge=1, le=1000),
+    order_by: Literal["total_ms", "count", "p99_ms", "max_ms", "rows"] = "total_ms",
+):
+    """Top-N fingerprints de SQL por tempo total (ou outra métrica) desde o último reset."""
+    return query_stats.top(limit=limit, order_by=order_by)
+
+@router.delete("/queries", status_code=status.HTTP_204_NO_CONTENT)
+def reset_query_fingerprints():
+    """Zera as estatísticas de consultas."""
+    query_stats.reset()
+
+@router.get("/memory")
+def read_memory():
+    """RSS, heap rastreado pelo tracemalloc e pico de memória por rota marcada."""
+    return {"gauges": memory_stats.gauges(), "tags": memory_stats.tags()}
+
+@router.delete("/memory", status_code=status.HTTP_204_NO_CONTENT)
+def reset_memory():
+    """Zera os picos de memória registrados por rota."""
+    memory_stats.reset()
+
+@router.post("/memory/snapshot", status_code=status.HTTP_204_NO_CONTENT)
+def take_memory_snapshot():
+    """Guarda um snapshot das alocações atuais como base para o diff."""
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Memory tracking is disabled (MEMORY_TRACKING_ENABLED)")
+    memory_stats.take_snapshot()
+
+@router.get("/memory/diff")
+def read_memory_diff(limit: int = Query(20, ge=1, le=500)):
+    """Locais de alocação que mais cresceram desde o último snapshot."""
+    if not tracemalloc.is_tracing():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Memory tracking is disabled (MEMORY_TRACKING_ENABLED)")
+    diff = memory_stats.diff(limit=limit)
+    if diff is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="No baseline snapshot; POST /admin/memory/snapshot first")
+    return diff
+
+@router.get("/single-flight")
+def list_single_flight_stats(limit: int = Query(20, ge=1, le=1000)):
+    """GETs coalescidos por chave: execuções (leaders), respostas compartilhadas e esperas estouradas."""
+    return single_flight_stats.top(limit=limit)
+
+@router.delete("/single-flight", status_code=status.HTTP_204_NO_CONTENT)
+def reset_single_flight_stats():
+    """Zera os contadores do single-flight."""
+    single_flight_stats.reset()
@@ -0,0 +1,101 @@
+# observability/profiling_middleware.py
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from database import SessionLocal, get_engine
+from auth.auth_service import get_user_from_token, has_role
+from .sampling_profiler import SamplingProfiler
+from .sql_capture import capture_queries
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_QUERY_PARAM = "__profile"
+# Valor do gatilho que devolve o perfil no corpo da resposta em vez de gravá-lo
+INLINE_FORMAT = "speedscope"
+
+
+def _is_admin(request: Request) -> bool:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    get_engine()
+    with SessionLocal() as db:
+        return has_role(get_user_from_token(db, token), "admin")
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """
+    Profiling sob demanda de uma requisição.
+
+    - Administradores disparam com o cabeçalho `X-Profile: 1` ou `?__profile=1`:
+      o perfil é gravado em `profile_dir` e o caminho volta em `X-Profile-File`.
+      Com o valor `speedscope`, o próprio perfil é devolvido como resposta.
+    - Com `sample_rate` > 0, uma fração aleatória das requisições também é
+      perfilada e gravada em `profile_dir`, para análise offline.
+
+    O perfil (formato speedscope) inclui as consultas SQL da requisição, com
+    duração e linhas. Sem gatilho e com `sample_rate` 0 o custo é só a leitura
+    de um cabeçalho.
+
+    Respostas em streaming (sem Content-Length, ex.: o SSE de /events) não são
+    bufferizadas: o profiler para quando a resposta começa e o corpo segue
+    direto para o cliente. O perfil cobre só o trabalho até esse ponto.
+    """
+
+    def __init__(self, app, profile_dir: str = "profiles", sample_rate: float = 0.0, interval: float = 0.005):
+        super().__init__(app)
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    async def dispatch(self, request: Request, call_next):
+        trigger = request.headers.get(PROFILE_HEADER) or request.query_params.get(PROFILE_QUERY_PARAM)
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not trigger and not sampled:
+            return await call_next(request)
+
+        if trigger and not await run_in_threadpool(_is_admin, request):
+            return JSONResponse(
+                status_code=status.HTTP_403_FORBIDDEN,
+                content={"detail": "Profiling is only available to administrators"},
+            )
+
+        profiler = SamplingProfiler(self.interval)
+        with capture_queries() as queries:
+            profiler.start()
+            try:
+                response = await call_next(request)
+                streaming = "content-length" not in response.headers
+                body = None if streaming else b"".join([chunk async for chunk in response.body_iterator])
+            finally:
+                profiler.stop()
+
+        name = f"{request.method} {request.url.path}"
+        profile = profiler.to_speedscope(name, queries)
+        if trigger == INLINE_FORMAT:
+            return JSONResponse(content=profile)
+
+        path = await run_in_threadpool(self._save, request, profile)
+        if body is None:
+            response.headers["X-Profile-File"] = path
+            return response
+        headers = dict(response.headers)
+        headers["X-Profile-File"] = path
+        return Response(content=body, status_code=response.status_code, headers=headers)
+
+    def _save(self, request: Request, profile: dict) -> str:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r"[^a-zA-Z0-9]+", "_", request.url.path).strip("_") or "root"
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{slug}-{uuid.uuid4().hex[:8]}.speedscope.json"
+        path = os.path.join(self.profile_dir, filename)
+        with open(path, "w") as f:
+            json.dump(profile, f)
+        return path
@@ -0,0 +1,179 @@
+# observability/query_stats.py
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Garante o listener que marca o início de cada execução (_query_started_at)
+from . import sql_capture  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# Escopo ASGI da requisição atual, para atribuir consultas lentas à rota
+current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.I)
+_SPACES = re.compile(r"\s+")
+
+
+# Os statements gerados pelo SQLAlchemy se repetem: o cache evita refazer as regex
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """
+    Normaliza um statement SQL para agrupar consultas de mesmo formato.
+
+    Literais e parâmetros viram `?`, listas (IN, VALUES) viram `(...)` e os
+    espaços são colapsados: `... WHERE id = 1` e `... WHERE id = 2` têm o
+    mesmo fingerprint.
+    """
+    text = _COMMENT.sub(" ", statement)
+    text = _STRING.sub("?", text)
+    text = _PARAM.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("(...)", text)
+    text = _VALUES_LIST.sub(r"\1", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+@dataclass
+class FingerprintStats:
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    # Últimas durações, para p50/p99 aproximados com memória limitada
+    samples: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    def as_dict(self, fingerprint: str) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            "fingerprint": fingerprint,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(_percentile(ordered, 0.50), 3),
+            "p99_ms": round(_percentile(ordered, 0.99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+        }
+
+
+class QueryStats:
+    """
+    Agregado em memória das consultas por fingerprint (contagem, tempo total,
+    p50/p99, máximo e linhas). Consultas acima de `slow_query_ms` são logadas
+    com a função (repositório/serviço) e a rota de origem.
+    O número de fingerprints é limitado a `max_fingerprints`.
+    """
+
+    OVERFLOW_FINGERPRINT = "<outros>"
+
+    def __init__(self, slow_query_ms: float = 200, max_fingerprints: int = 1000):
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self._stats: dict[str, FingerprintStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration_ms: float, rows: int) -> str:
+        key = fingerprint(statement)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    key = self.OVERFLOW_FINGERPRINT
+                stats = self._stats.setdefault(key, FingerprintStats())
+            stats.count += 1
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.rows += max(rows, 0)
+            stats.samples.append(duration_ms)
+        return key
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> list[dict]:
+        with self._lock:
+            rows = [stats.as_dict(key) for key, stats in self._stats.items()]
+        return sorted(rows, key=lambda row: row[order_by], reverse=True)[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+query_stats = QueryStats()
+
+
+_CALL_SITE_SUFFIXES = ("_repository.py", "_service.py", "_controller.py")
+
+
+def _call_site() -> str | None:
+    """
+    Função da aplicação mais próxima da consulta na pilha atual: normalmente
+    a do repositório; para lazy loads (ex.: user.role), o serviço ou controller.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.endswith(_CALL_SITE_SUFFIXES):
+            module = filename.rsplit("/", 1)[-1][:-3]
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _current_route() -> str | None:
+    scope = current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope.get('method')} {getattr(route, 'path', scope.get('path'))}"
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "_query_started_at", None)
+    if started_at is None:
+        return
+    duration_ms = (time.perf_counter() - started_at) * 1000
+    key = query_stats.record(statement, duration_ms, cursor.rowcount)
+    if duration_ms >= query_stats.slow_query_ms:
+        logger.warning(
+            "Consulta lenta (%.1f ms, %s linhas) em %s [rota %s]: %s",
+            duration_ms, cursor.rowcount, _call_site() or "?", _current_route() or "?", key,
+        )
+
+
+class QueryContextMiddleware:
+    """Middleware ASGI que expõe o escopo da requisição para o log de consultas lentas."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
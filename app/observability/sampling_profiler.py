@@ -0,0 +1,119 @@
+# observability/sampling_profiler.py
+import os
+import sys
+import threading
+import time
+
+# Funções em que uma thread está apenas esperando trabalho (não entram no perfil)
+_IDLE_FUNCTIONS = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FUNCTIONS
+
+
+class SamplingProfiler:
+    """
+    Profiler por amostragem para uma única requisição.
+
+    Uma thread auxiliar lê as pilhas de todas as threads (`sys._current_frames`)
+    a cada `interval` segundos enquanto o profiler está ativo. Assim aparecem
+    tanto o event loop quanto as threads do threadpool que executam as rotas
+    síncronas (bcrypt, PIL, SQLAlchemy). Threads ociosas são ignoradas.
+    Sem o profiler ativo não há custo algum.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        # thread -> lista de (instante, pilha da raiz até a folha)
+        self.samples: dict[str, list[tuple[float, list[tuple[str, str, int]]]]] = {}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.setdefault(names.get(thread_id, str(thread_id)), []).append((now, stack))
+
+    def to_speedscope(self, name: str, queries=()) -> dict:
+        """
+        Exporta no formato do speedscope (https://www.speedscope.app).
+
+        Cada thread vira um perfil "sampled". As consultas SQL capturadas viram
+        um perfil "evented" à parte, com cada statement como um bloco na linha do tempo.
+        """
+        frames: list[dict] = []
+        frame_index: dict[tuple, int] = {}
+
+        def index_of(key: tuple, frame: dict) -> int:
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append(frame)
+            return frame_index[key]
+
+        end_value = (self.stopped_at - self.started_at) * 1000
+        profiles = []
+        for thread_name, samples in self.samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": end_value,
+                "samples": [
+                    [index_of((fn, file, line), {"name": fn, "file": file, "line": line}) for fn, file, line in stack]
+                    for _, stack in samples
+                ],
+                "weights": [self.interval * 1000] * len(samples),
+            })
+
+        if queries:
+            events = []
+            for query in sorted(queries, key=lambda q: q.started_at):
+                frame = index_of(("sql", query.statement), {"name": f"SQL ({query.rows} rows): {query.statement}"})
+                start = max(0.0, (query.started_at - self.started_at) * 1000)
+                events.append({"type": "O", "frame": frame, "at": start})
+                events.append({"type": "C", "frame": frame, "at": start + query.duration_ms})
+            profiles.append({
+                "type": "evented",
+                "name": "SQL",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": max(end_value, max(event["at"] for event in events)),
+                "events": events,
+            })
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "programacaiii_api",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
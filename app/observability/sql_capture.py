@@ -0,0 +1,55 @@
+# observability/sql_capture.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+@dataclass
+class CapturedQuery:
+    statement: str
+    started_at: float     # time.perf_counter() no início da execução
+    duration_ms: float
+    rows: int
+
+
+# Lista de consultas da requisição sendo perfilada (None = captura desligada).
+# Como é um ContextVar, a lista acompanha a requisição inclusive nas rotas
+# síncronas executadas no threadpool.
+_captured_queries: ContextVar[list[CapturedQuery] | None] = ContextVar("captured_queries", default=None)
+
+
+@contextmanager
+def capture_queries():
+    """Coleta as consultas SQL executadas dentro do bloco (no contexto atual)."""
+    queries: list[CapturedQuery] = []
+    token = _captured_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        _captured_queries.reset(token)
+
+
+# Os listeners valem para todas as engines (criadas sob demanda em database.py)
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "_query_started_at", None)
+    if started_at is None:
+        return
+    queries = _captured_queries.get()
+    if queries is not None:
+        queries.append(CapturedQuery(
+            statement=statement,
+            started_at=started_at,
+            duration_ms=(time.perf_counter() - started_at) * 1000,
+            rows=cursor.rowcount,
+        ))
@@ -0,0 +1,46 @@
+# rate_limit/load_monitor.py
+import asyncio
+import time
+
+import anyio.to_thread
+
+
+class LoadMonitor:
+    """
+    Mede o atraso (lag) do event loop.
+
+    Uma tarefa dorme `interval` segundos em loop; o quanto ela acorda atrasada
+    indica o quanto o loop está ocupado. É iniciada no lifespan da aplicação.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.loop_lag_ms = 0.0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval) * 1000
+            # Média móvel para não reagir a um único pico
+            self.loop_lag_ms = 0.7 * self.loop_lag_ms + 0.3 * lag
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.loop_lag_ms = 0.0
+
+
+def threadpool_queue_depth() -> int:
+    """Quantas chamadas síncronas (rotas `def`) aguardam uma thread livre."""
+    return anyio.to_thread.current_default_thread_limiter().statistics().tasks_waiting
@@ -0,0 +1,152 @@
+# rate_limit/rate_limit_middleware.py
+import ipaddress
+import math
+from dataclasses import dataclass
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from security import SECRET_KEY, ALGORITHM
+from .load_monitor import threadpool_queue_depth
+
+
+@dataclass(frozen=True)
+class RatePolicy:
+    """
+    Política de token bucket para um conjunto de rotas.
+
+    `rate` é a recarga em requisições por segundo e `burst` o tamanho do bucket.
+    `key_by` define quem divide o bucket: "ip" ou "subject" (o `sub` do token,
+    com o IP como alternativa para requisições anônimas).
+    """
+    name: str
+    methods: frozenset[str]
+    path_prefix: str
+    rate: float
+    burst: int
+    key_by: str = "subject"
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and path.startswith(self.path_prefix)
+
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+ALL_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"})
+
+# A primeira política que casar com a requisição é aplicada
+DEFAULT_POLICIES = (
+    # Login roda bcrypt: poucas tentativas por IP
+    RatePolicy("login", frozenset({"POST"}), "/auth/login", rate=10 / 60, burst=10, key_by="ip"),
+    # Criação/edição de usuários roda bcrypt e PIL
+    RatePolicy("users-write", WRITE_METHODS, "/users", rate=30 / 60, burst=10),
+    RatePolicy("write", WRITE_METHODS, "/", rate=2, burst=20),
+    RatePolicy("read", ALL_METHODS, "/", rate=20, burst=40),
+)
+
+
+def _in_networks(host: str, networks: list) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def _client_ip(request: Request, trusted_proxies: list = (), trust_peer: bool = False) -> str:
+    """
+    IP do cliente. Se a conexão vem de um proxy confiável (`trust_peer` ou um
+    IP em `trusted_proxies`), usa o X-Forwarded-For da direita para a esquerda
+    até o primeiro endereço que não seja de um proxy confiável: os anteriores
+    podem ter sido enviados pelo próprio cliente.
+    """
+    host = request.client.host if request.client else "unknown"
+    if not (trust_peer or _in_networks(host, trusted_proxies)):
+        return host
+    forwarded = [item.strip() for item in request.headers.get("x-forwarded-for", "").split(",") if item.strip()]
+    for address in reversed(forwarded):
+        host = address
+        if not _in_networks(address, trusted_proxies):
+            break
+    return host
+
+
+def _token_subject(request: Request) -> str | None:
+    """Lê o `sub` do token JWT sem consultar o banco (apenas a assinatura é verificada)."""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """
+    Limita a taxa de requisições e descarta carga antes de qualquer trabalho.
+
+    `trusted_proxies` são os IPs/redes dos proxies reversos à frente da API;
+    "*" confia em quem estiver conectado (a API só é acessível pelo proxy, como
+    no Render). Deles, o IP do cliente é lido do X-Forwarded-For.
+
+    Ordem das verificações:
+    1. Load shedding: se o event loop está atrasado mais que `max_loop_lag_ms`
+       ou a fila do threadpool passou de `max_queue_depth`, responde 503.
+    2. Token bucket da política da rota, por IP e/ou usuário: sem token, responde 429.
+    """
+
+    def __init__(self, app, store, policies=DEFAULT_POLICIES, monitor=None,
+                 max_loop_lag_ms: float = 500, max_queue_depth: int = 100,
+                 store_in_threadpool: bool = False, trusted_proxies=()):
+        super().__init__(app)
+        self.store = store
+        self.policies = tuple(policies)
+        self.monitor = monitor
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.max_queue_depth = max_queue_depth
+        # Armazenamentos que fazem I/O (banco) não podem bloquear o event loop
+        self.store_in_threadpool = store_in_threadpool
+        self.trust_peer = "*" in trusted_proxies
+        self.trusted_proxies = [ipaddress.ip_network(proxy, strict=False)
+                                for proxy in trusted_proxies if proxy != "*"]
+
+    async def dispatch(self, request: Request, call_next):
+        overloaded = self._overload_reason()
+        if overloaded:
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": f"Server overloaded ({overloaded}), try again later"},
+                headers={"Retry-After": "1"},
+            )
+
+        policy = next((p for p in self.policies if p.matches(request.method, request.url.path)), None)
+        if policy is None:
+            return await call_next(request)
+
+        client = _client_ip(request, self.trusted_proxies, self.trust_peer)
+        if policy.key_by == "subject":
+            client = _token_subject(request) or client
+        key = f"{policy.name}:{client}"
+
+        if self.store_in_threadpool:
+            allowed, retry_after = await run_in_threadpool(self.store.consume, key, policy.rate, policy.burst)
+        else:
+            allowed, retry_after = self.store.consume(key, policy.rate, policy.burst)
+        if not allowed:
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after))), "X-RateLimit-Policy": policy.name},
+            )
+        return await call_next(request)
+
+    def _overload_reason(self) -> str | None:
+        if self.monitor is not None and self.monitor.loop_lag_ms > self.max_loop_lag_ms:
+            return "event loop lag"
+        if threadpool_queue_depth() > self.max_queue_depth:
+            return "threadpool queue"
+        return None
@@ -0,0 +1,14 @@
+# rate_limit/rate_limit_model.py
+from sqlalchemy import Boolean, Column, DateTime, Float, String
+from database import Base
+
+# Modelo da Tabela SQLAlchemy
+# Um token bucket por chave (política + cliente), compartilhado entre workers.
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    __table_args__ = {'extend_existing': True}
+
+    key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    allowed = Column(Boolean, nullable=False, default=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, index=True)
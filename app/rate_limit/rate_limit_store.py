@@ -0,0 +1,112 @@
+# rate_limit/rate_limit_store.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import DatabaseUnavailable, SessionLocal, get_engine
+from .rate_limit_model import RateLimitBucket  # registra a tabela na Base (create_all)
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBucketStore:
+    """
+    Token buckets em memória (um processo).
+
+    `consume` devolve (permitido, segundos até haver um token disponível).
+    O número de buckets é limitado a `max_keys`; os menos usados são descartados.
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, rate: float, burst: int) -> tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+# Recarga e consumo do bucket em um único UPSERT atômico
+_CONSUME_SQL = text("""
+    INSERT INTO rate_limit_buckets AS b (key, tokens, allowed, updated_at)
+    VALUES (:key, :burst - 1, true, now())
+    ON CONFLICT (key) DO UPDATE SET
+        allowed = LEAST(:burst, b.tokens + GREATEST(0, EXTRACT(EPOCH FROM now() - b.updated_at)) * :rate) >= 1,
+        tokens = LEAST(:burst, b.tokens + GREATEST(0, EXTRACT(EPOCH FROM now() - b.updated_at)) * :rate)
+                 - CASE WHEN LEAST(:burst, b.tokens + GREATEST(0, EXTRACT(EPOCH FROM now() - b.updated_at)) * :rate) >= 1
+                        THEN 1 ELSE 0 END,
+        updated_at = now()
+    RETURNING allowed, tokens
+""")
+
+
+# Buckets parados há mais tempo que o necessário para encher já estão cheios:
+# apagar a linha equivale a mantê-la
+_PRUNE_SQL = text("""
+    DELETE FROM rate_limit_buckets
+    WHERE updated_at < now() - make_interval(secs => :idle_seconds)
+""")
+
+
+class DatabaseBucketStore:
+    """
+    Token buckets na tabela `rate_limit_buckets`, compartilhados entre workers e instâncias.
+
+    A cada `prune_every` consumos, apaga os buckets parados há mais tempo que
+    o maior tempo de recarga já visto (burst / rate). Com o banco
+    indisponível, as requisições passam (fail open) em vez de virarem 500.
+    """
+
+    def __init__(self, prune_every: int = 1000):
+        self.prune_every = prune_every
+        self._consumed = 0
+        self._refill_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, rate: float, burst: int) -> tuple[bool, float]:
+        try:
+            get_engine()
+            with SessionLocal() as db:
+                allowed, tokens = db.execute(_CONSUME_SQL, {"key": key, "rate": rate, "burst": burst}).one()
+                db.commit()
+        except (DatabaseUnavailable, SQLAlchemyError) as e:
+            logger.warning("Rate limit indisponível, requisição liberada: %s", e)
+            return True, 0.0
+        self._maybe_prune(burst / rate)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def _maybe_prune(self, refill_seconds: float) -> None:
+        with self._lock:
+            self._refill_seconds = max(self._refill_seconds, refill_seconds)
+            self._consumed += 1
+            if self._consumed % self.prune_every:
+                return
+            idle_seconds = self._refill_seconds
+        try:
+            with SessionLocal() as db:
+                db.execute(_PRUNE_SQL, {"idle_seconds": idle_seconds})
+                db.commit()
+        except (DatabaseUnavailable, SQLAlchemyError):
+            logger.warning("Falha ao apagar buckets de rate limit parados", exc_info=True)
+
+
+def create_bucket_store(settings):
+    """Escolhe o armazenamento de acordo com `settings.rate_limit_backend`."""
+    if settings.rate_limit_backend == "database":
+        return DatabaseBucketStore()
+    return MemoryBucketStore()
@@ -0,0 +1,85 @@
+# resilience/circuit_breaker.py
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker do banco de dados.
+
+    - closed: tudo passa; `failure_threshold` falhas seguidas (timeouts ou
+      conexões perdidas) abrem o circuito.
+    - open: as chamadas falham na hora, sem esperar timeouts do banco.
+    - half_open: passado `reset_timeout`, a primeira chamada executa `probe`
+      (as demais continuam falhando na hora). Se o probe funcionar o circuito
+      fecha; senão volta a abrir por mais `reset_timeout` segundos.
+    """
+
+    def __init__(self, probe: Callable[[], None], failure_threshold: int = 3, reset_timeout: float = 5):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._probing = threading.Lock()
+
+    def is_open(self) -> bool:
+        """Circuito aberto e ainda sem direito a uma nova tentativa (probe)."""
+        return self.state != CLOSED and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def retry_after(self) -> int:
+        """Segundos até a próxima tentativa de reabrir o banco (cabeçalho Retry-After)."""
+        remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def allow(self) -> bool:
+        """Indica se uma chamada ao banco pode prosseguir (fazendo o probe quando for a hora)."""
+        if self.state == CLOSED:
+            return True
+        if self.is_open() or not self._probing.acquire(blocking=False):
+            return False
+        try:
+            self.state = HALF_OPEN
+            try:
+                self.probe()
+            except Exception:
+                logger.warning("Banco de dados ainda indisponível (probe falhou)", exc_info=True)
+                self.trip()
+                return False
+            self.reset()
+            return True
+        finally:
+            self._probing.release()
+
+    def record_success(self) -> None:
+        self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == CLOSED and self._failures >= self.failure_threshold:
+                self.trip()
+
+    def trip(self) -> None:
+        """Abre o circuito."""
+        if self.state == CLOSED:
+            logger.error("Circuit breaker do banco aberto: escritas recebem 503 e leituras usam o cache")
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        """Fecha o circuito."""
+        if self.state != CLOSED:
+            logger.warning("Circuit breaker do banco fechado: banco de dados disponível")
+        self.state = CLOSED
+        self._failures = 0
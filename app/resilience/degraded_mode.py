@@ -0,0 +1,98 @@
+# resilience/degraded_mode.py
+import hashlib
+from dataclasses import dataclass
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import OperationalError
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from database import DatabaseUnavailable, get_breaker, is_unavailable_error
+from .stale_cache import StaleCache
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+STALE_WARNING = '110 - "Response is Stale"'
+
+
+def _unavailable_response(request: Request) -> JSONResponse:
+    # Marca a requisição para o DegradedModeMiddleware tentar o cache
+    request.state.database_unavailable = True
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database unavailable"},
+        headers={"Retry-After": str(get_breaker().retry_after())},
+    )
+
+
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    """Circuito aberto: 503 imediato com Retry-After."""
+    return _unavailable_response(request)
+
+
+async def operational_error_handler(request: Request, exc: OperationalError):
+    """Timeouts e conexões perdidas viram 503; os demais erros continuam 500."""
+    if is_unavailable_error(exc):
+        return _unavailable_response(request)
+    return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        content={"detail": "Internal Server Error"})
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    content_type: str | None
+
+
+class DegradedModeMiddleware(BaseHTTPMiddleware):
+    """
+    Modo degradado enquanto o circuit breaker do banco estiver aberto.
+
+    - Escritas (métodos que não são GET/HEAD/OPTIONS) recebem 503 na hora,
+      sem gastar CPU (bcrypt, validação) antes de descobrir que o banco caiu.
+    - Respostas 200 dos GETs das rotas em `routes` (pelo nome da rota) são
+      guardadas por URL, Accept e Authorization, dentro do limite de bytes
+      do cache (corpos maiores que ele não são guardados). Se depois a mesma leitura
+      falhar por indisponibilidade do banco, a última resposta boa é servida
+      com os cabeçalhos `Warning` e `Age`.
+
+    A autenticação continua valendo: o token é validado normalmente e o
+    usuário vem do cache de principals de `auth_service` (ver get_user_from_token).
+    """
+
+    def __init__(self, app, routes: list[str], cache: StaleCache):
+        super().__init__(app)
+        self.routes = set(routes)
+        self.cache = cache
+
+    @staticmethod
+    def _key(request: Request) -> tuple:
+        authorization = hashlib.sha256(request.headers.get("authorization", "").encode()).hexdigest()
+        return (request.url.path, request.url.query, request.headers.get("accept", ""), authorization)
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method not in SAFE_METHODS and get_breaker().is_open():
+            return _unavailable_response(request)
+
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if request.method != "GET" or getattr(route, "name", None) not in self.routes:
+            return response
+
+        if response.status_code == status.HTTP_200_OK:
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            self.cache.put(self._key(request), CachedResponse(body, response.headers.get("content-type")),
+                           size=len(body))
+            return Response(content=body, status_code=response.status_code, headers=dict(response.headers),
+                            background=response.background)
+
+        if (response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+                and getattr(request.state, "database_unavailable", False)):
+            cached = self.cache.get(self._key(request))
+            if cached is not None:
+                stale, age = cached
+                return Response(
+                    content=stale.body,
+                    media_type=stale.content_type,
+                    headers={"Warning": STALE_WARNING, "Age": str(int(age)), "Vary": "Accept"},
+                )
+        return response
@@ -0,0 +1,198 @@
+# resilience/single_flight.py
+import asyncio
+import threading
+from dataclasses import dataclass, field
+
+from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.routing import Match
+
+from auth.auth_service import get_user_from_token, has_role
+from database import READ_YOUR_WRITES_COOKIE, SessionLocal, get_engine
+from observability.profiling_middleware import PROFILE_HEADER, PROFILE_QUERY_PARAM
+from security import ALGORITHM, SECRET_KEY
+
+
+@dataclass
+class KeyStats:
+    leaders: int = 0       # requisições que executaram a consulta
+    followers: int = 0     # requisições atendidas com a resposta de outra
+    timeouts: int = 0      # desistiram de esperar e executaram sozinhas
+    max_waiting: int = 0   # maior número de requisições esperando a mesma execução
+
+    def as_dict(self, key: str) -> dict:
+        return {"key": key, "leaders": self.leaders, "followers": self.followers,
+                "timeouts": self.timeouts, "max_waiting": self.max_waiting}
+
+
+class SingleFlightStats:
+    """Contadores por chave (rota, parâmetros e perfil), limitados a `max_keys`."""
+
+    OVERFLOW_KEY = "<outros>"
+
+    def __init__(self, max_keys: int = 1000):
+        self.max_keys = max_keys
+        self._stats: dict[str, KeyStats] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> KeyStats:
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_keys:
+                    key = self.OVERFLOW_KEY
+                stats = self._stats.setdefault(key, KeyStats())
+            return stats
+
+    def top(self, limit: int = 20) -> list[dict]:
+        with self._lock:
+            rows = [stats.as_dict(key) for key, stats in self._stats.items()]
+        return sorted(rows, key=lambda row: row["followers"], reverse=True)[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+single_flight_stats = SingleFlightStats()
+
+
+@dataclass
+class Flight:
+    """Execução em andamento de uma leitura, compartilhada pelas requisições idênticas."""
+    loop: asyncio.AbstractEventLoop
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    waiting: int = 0
+    start: dict | None = None
+    body: list[bytes] = field(default_factory=list)
+    shareable: bool = False
+
+
+def _token_claims(token: str) -> tuple[str, str] | None:
+    """Perfil e usuário (`sub`) declarados no token (assinatura e validade conferidas), ou None."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    role, subject = payload.get("role"), payload.get("sub")
+    return (role, subject) if role and subject else None
+
+
+def _has_scope(token: str, role: str) -> bool:
+    """Confere no banco (ou no cache de principals) que o usuário ainda tem o perfil."""
+    get_engine()
+    with SessionLocal() as db:
+        return has_role(get_user_from_token(db, token), role)
+
+
+class SingleFlightMiddleware:
+    """
+    Middleware ASGI que junta GETs idênticos e simultâneos em uma só execução.
+
+    A primeira requisição de uma chave (rota, parâmetros, Accept e perfil do
+    usuário; nas rotas fora de `shared_routes`, também o próprio usuário)
+    executa normalmente; as que chegam enquanto ela está em andamento
+    esperam até `max_wait` segundos e recebem o mesmo corpo já serializado.
+    Cada uma ainda passa pela própria verificação de acesso (o usuário do token
+    precisa ter o perfil da chave), mas sem a consulta e a serialização da rota.
+    Só respostas 2xx são compartilhadas: com outro status (ex.: um 401/403 do
+    token de quem executou), ou se a espera estourar, a requisição executa
+    sozinha.
+
+    Só vale para as rotas em `routes` (pelo nome). Apenas as de `shared_routes`,
+    cuja resposta não depende do usuário além do perfil, são compartilhadas
+    entre usuários diferentes.
+    """
+
+    def __init__(self, app, routes: list[str], shared_routes: list[str] = (), max_wait: float = 5.0,
+                 stats: SingleFlightStats = single_flight_stats):
+        self.app = app
+        self.routes = set(routes)
+        self.shared_routes = set(shared_routes)
+        self.max_wait = max_wait
+        self.stats = stats
+        self._flights: dict[tuple, Flight] = {}
+
+    def _route_name(self, scope) -> str | None:
+        for route in scope["app"].router.routes:
+            if getattr(route, "name", None) not in self.routes:
+                continue
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.name
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        claims = _token_claims(token) if scheme.lower() == "bearer" and token else None
+        route_name = self._route_name(scope) if claims is not None else None
+        if (route_name is None
+                or PROFILE_HEADER in request.headers or PROFILE_QUERY_PARAM in request.query_params):
+            await self.app(scope, receive, send)
+            return
+
+        role, subject = claims
+        # Fora das rotas compartilhadas, só requisições do mesmo usuário se juntam
+        owner = None if route_name in self.shared_routes else subject
+        key = (request.url.path, request.url.query, request.headers.get("accept", ""), role, owner,
+               # Quem acabou de escrever lê do primário: não compartilha com quem lê da réplica
+               bool(request.cookies.get(READ_YOUR_WRITES_COOKIE)))
+        label = f"GET {request.url.path}{'?' + request.url.query if request.url.query else ''} [{role}]"
+        stats = self.stats.get(label)
+
+        flight = self._flights.get(key)
+        if flight is None or flight.loop is not asyncio.get_running_loop():
+            await self._lead(key, stats, scope, receive, send)
+        else:
+            await self._follow(flight, stats, token, role, scope, receive, send)
+
+    async def _lead(self, key, stats: KeyStats, scope, receive, send):
+        flight = Flight(loop=asyncio.get_running_loop())
+        self._flights[key] = flight
+        stats.leaders += 1
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                flight.start = message
+            elif message["type"] == "http.response.body":
+                flight.body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    flight.shareable = flight.start is not None and 200 <= flight.start["status"] < 300
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done.set()
+
+    async def _follow(self, flight: Flight, stats: KeyStats, token: str, role: str, scope, receive, send):
+        if not await run_in_threadpool(_has_scope, token, role):
+            await self.app(scope, receive, send)
+            return
+
+        flight.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, flight.waiting)
+        try:
+            await asyncio.wait_for(flight.done.wait(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            await self.app(scope, receive, send)
+            return
+        finally:
+            flight.waiting -= 1
+
+        if not flight.shareable:
+            await self.app(scope, receive, send)
+            return
+        stats.followers += 1
+        # Cookies são da resposta de outro cliente: não são repassados
+        headers = [(name, value) for name, value in flight.start["headers"] if name.lower() != b"set-cookie"]
+        await send({"type": "http.response.start", "status": flight.start["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": b"".join(flight.body)})
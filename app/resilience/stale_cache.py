@@ -0,0 +1,59 @@
+# resilience/stale_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class StaleCache:
+    """
+    Último valor bom conhecido por chave (LRU limitado a `max_entries` e,
+    com `max_bytes`, ao total de bytes informado em `put`), para servir
+    enquanto o banco estiver fora. Entradas mais velhas que
+    `max_age_seconds` não são servidas.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_age_seconds: float = 600, max_bytes: int | None = None):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Any, tuple[float, Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, key, value, size: int = 0) -> None:
+        """Guarda `value`; um valor maior que `max_bytes` sozinho não é guardado."""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic(), value, size)
+            self._bytes += size
+            while (len(self._entries) > self.max_entries
+                   or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def get(self, key) -> tuple[Any, float] | None:
+        """Devolve (valor, idade em segundos) ou None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = time.monotonic() - entry[0]
+        if age > self.max_age_seconds:
+            return None
+        return entry[1], age
+
+    def discard(self, key) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
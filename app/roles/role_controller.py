@@ -1,14 +1,16 @@
 # roles/role_controller.py
 from typing import List
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 from sqlalchemy.orm import Session
 
 from database import get_db
 from . import role_service, role_model
+from utils.content_negotiation import NegotiatedRoute
 from auth.auth_service import require_role, get_current_user
 
 router = APIRouter(
     prefix="/roles",
+    route_class=NegotiatedRoute,
     tags=["Roles"],
     dependencies=[Depends(get_current_user)]
 )
@@ -25,6 +27,19 @@ def list_roles(db: Session = Depends(get_db)):
     """Lista todos os perfis (apenas para administradores)."""
     return role_service.get_all(db)
 
+@router.get("/stats", response_model=role_model.RoleStats,
+            dependencies=[Depends(require_role("admin"))])
+def get_role_stats(db: Session = Depends(get_db)):
+    """Quantidade de usuários por perfil e o total (apenas para administradores)."""
+    return role_service.get_role_stats(db)
+
+@router.get("/changes", response_model=role_model.RoleChanges,
+            dependencies=[Depends(require_role("admin"))])
+def list_role_changes(since: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000),
+                      db: Session = Depends(get_db)):
+    """Sincronização incremental dos perfis alterados/excluídos depois de `since` (apenas para administradores)."""
+    return role_service.get_role_changes(db, since=since, limit=limit)
+
 @router.get("/{role_id}", response_model=role_model.RolePublic,
             dependencies=[Depends(require_role("admin"))])
 def get_role(role_id: int, db: Session = Depends(get_db)):
@@ -1,7 +1,9 @@
 # roles/role_model.py
-from sqlalchemy import Column, Integer, String
+from typing import List
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer, String
 from pydantic import BaseModel, ConfigDict
 from database import Base
+from events.event_model import change_version_seq
 
 # Modelo da Tabela SQLAlchemy
 class Role(Base):
@@ -10,6 +12,20 @@ class Role(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
+    # Versão da última mudança (sequência global), usada em /roles/changes
+    version = Column(BigInteger, change_version_seq, nullable=False, index=True,
+                     server_default=change_version_seq.next_value(),
+                     onupdate=change_version_seq.next_value())
+
+# Contador de usuários por perfil, mantido na mesma transação de cada
+# INSERT/UPDATE/DELETE de usuário (user_repository) e reconciliado
+# periodicamente. Fica fora de `roles` para não alterar a versão do perfil.
+class RoleMemberCount(Base):
+    __tablename__ = "role_member_counts"
+    __table_args__ = {'extend_existing': True}
+
+    role_id = Column(Integer, ForeignKey("roles.id", ondelete="CASCADE"), primary_key=True)
+    member_count = Column(Integer, nullable=False, default=0)
 
 # Schema Pydantic para criar um Role
 class RoleCreate(BaseModel):
@@ -32,3 +48,21 @@ class RolePublic(BaseModel):
     
     id: int
     name: str
+
+class RoleVersioned(RolePublic):
+    version: int
+
+# Página de sincronização incremental de perfis
+class RoleChanges(BaseModel):
+    items: List[RoleVersioned]
+    deleted: List[int]
+    version: int
+    has_more: bool
+
+# Estatísticas de membros por perfil (/roles/stats)
+class RoleMemberStats(RolePublic):
+    member_count: int
+
+class RoleStats(BaseModel):
+    total_users: int
+    roles: List[RoleMemberStats]
@@ -0,0 +1,44 @@
+# roles/role_reconciler.py
+import logging
+import threading
+
+from database import SessionLocal, get_engine, use_primary
+from . import role_repository
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile_member_counts() -> dict[int, tuple[int, int]]:
+    """Corrige os contadores de membros que divergiram da tabela de usuários."""
+    get_engine()
+    with use_primary(SessionLocal()) as db:
+        corrections = role_repository.reconcile_member_counts(db)
+    if corrections is None:
+        logger.debug("Contadores de membros já estão sendo reconciliados por outro processo")
+        return {}
+    for role_id, (stored, actual) in corrections.items():
+        logger.warning("Contador de membros do perfil %s corrigido: %s -> %s", role_id, stored, actual)
+    return corrections
+
+
+class MemberCountReconciler(threading.Thread):
+    """
+    Reconcilia os contadores de membros por perfil a cada `interval` segundos
+    (e logo ao iniciar, o que também preenche os contadores de um banco novo).
+    """
+
+    def __init__(self, interval: float = 300):
+        super().__init__(name="member-count-reconciler", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                reconcile_member_counts()
+            except Exception:
+                logger.exception("Falha ao reconciliar os contadores de membros")
+            self._stop_event.wait(self.interval)
@@ -1,5 +1,9 @@
 # roles/role_repository.py
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
+from database import commit
+from users.user_model import User
 from . import role_model
 
 def get_role_by_name(db: Session, name: str):
@@ -13,23 +17,109 @@ def get_role_by_id(db: Session, role_id: int):
     return db.query(role_model.Role).filter(role_model.Role.id == role_id).first()
 
 def create_role(db: Session, role: role_model.RoleCreate):
-    db_role = role_model.Role(name=role.name)
-    db.add(db_role)
-    db.commit()
-    db.refresh(db_role)
+    # INSERT ... RETURNING: grava e obtém o ID em uma única ida ao banco.
+    # Nome duplicado gera IntegrityError (restrição UNIQUE), tratada no serviço.
+    stmt = insert(role_model.Role).values(name=role.name).returning(role_model.Role)
+    db_role = db.scalars(stmt).one()
+    commit(db)
     return db_role
 
-def update_role(db: Session, db_role: role_model.Role, role_in: role_model.RoleUpdate):
+def update_role(db: Session, role_id: int, role_in: role_model.RoleUpdate):
+    """Atualiza o perfil com UPDATE ... RETURNING. Retorna None se o ID não existir."""
     update_data = role_in.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_role, key, value)
-    
-    db.add(db_role)
-    db.commit()
-    db.refresh(db_role)
+    if not update_data:
+        return get_role_by_id(db, role_id)
+
+    stmt = (update(role_model.Role)
+            .where(role_model.Role.id == role_id)
+            .values(**update_data)
+            .returning(role_model.Role))
+    db_role = db.scalars(stmt).one_or_none()
+    commit(db)
     return db_role
 
 def delete_role(db: Session, db_role: role_model.Role):
     db.delete(db_role)
-    db.commit()
-    return db_role
\ No newline at end of file
+    commit(db)
+    return db_role
+
+# --- CONTADORES DE MEMBROS ---
+
+def adjust_member_count(db: Session, role_id: int, delta: int):
+    """
+    Soma `delta` ao contador de membros do perfil (UPSERT). Deve rodar na
+    mesma transação da escrita do usuário para o contador não divergir.
+    """
+    adjust_member_counts(db, {role_id: delta})
+
+def adjust_member_counts(db: Session, deltas: dict[int, int]):
+    """Versão em lote de `adjust_member_count`: um único UPSERT para vários perfis."""
+    rows = [{"role_id": role_id, "member_count": delta}
+            # Ordem fixa de bloqueio das linhas, para evitar deadlock entre lotes
+            for role_id, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    counts = role_model.RoleMemberCount.__table__
+    stmt = pg_insert(counts).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[counts.c.role_id],
+        set_={"member_count": counts.c.member_count + stmt.excluded.member_count},
+    )
+    db.execute(stmt)
+
+def get_member_count(db: Session, role_id: int, for_update: bool = False) -> int:
+    """Membros do perfil segundo o contador (sem varrer a tabela de usuários)."""
+    stmt = select(role_model.RoleMemberCount.member_count).where(role_model.RoleMemberCount.role_id == role_id)
+    if for_update:
+        stmt = stmt.with_for_update()
+    return db.scalar(stmt) or 0
+
+def get_role_stats(db: Session):
+    """Perfis com o respectivo contador de membros (0 se ainda não houver contador)."""
+    member_count = func.coalesce(role_model.RoleMemberCount.member_count, 0).label("member_count")
+    stmt = (select(role_model.Role.id, role_model.Role.name, member_count)
+            .outerjoin(role_model.RoleMemberCount, role_model.RoleMemberCount.role_id == role_model.Role.id)
+            .order_by(role_model.Role.id))
+    return db.execute(stmt).all()
+
+# Chave do advisory lock da reconciliação (ver reconcile_member_counts)
+RECONCILE_LOCK_KEY = 0x726d6363
+
+def reconcile_member_counts(db: Session) -> dict[int, tuple[int, int]] | None:
+    """
+    Recalcula os contadores com COUNT(*) ... GROUP BY e corrige os que divergem.
+    Retorna {role_id: (valor_anterior, valor_correto)} das correções feitas,
+    ou None se outro processo já estiver reconciliando.
+
+    Só um processo reconcilia por vez (pg_try_advisory_xact_lock): com vários
+    workers/instâncias, os demais pulam a rodada em vez de enfileirar um
+    LOCK TABLE atrás do outro. O LOCK TABLE espera as transações que estão
+    ajustando contadores terminarem e segura as próximas até o fim, para que
+    a contagem não sobrescreva um incremento feito no meio da reconciliação.
+    """
+    if not db.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": RECONCILE_LOCK_KEY}):
+        db.rollback()
+        return None
+    db.execute(text("LOCK TABLE role_member_counts IN EXCLUSIVE MODE"))
+    actual = dict(db.execute(
+        select(role_model.Role.id, func.count(User.id))
+        .outerjoin(User, User.role_id == role_model.Role.id)
+        .group_by(role_model.Role.id)
+    ).all())
+    stored = dict(db.execute(
+        select(role_model.RoleMemberCount.role_id, role_model.RoleMemberCount.member_count)
+    ).all())
+
+    corrections = {role_id: (stored.get(role_id), count)
+                   for role_id, count in actual.items() if stored.get(role_id) != count}
+    if corrections:
+        counts = role_model.RoleMemberCount.__table__
+        stmt = pg_insert(counts).values([
+            {"role_id": role_id, "member_count": count} for role_id, (_, count) in corrections.items()
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[counts.c.role_id],
+            set_={"member_count": stmt.excluded.member_count},
+        ))
+    commit(db)
+    return corrections
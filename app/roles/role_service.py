@@ -1,17 +1,32 @@
 # roles/role_service.py
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
+from database import is_foreign_key_violation, is_unique_violation, unit_of_work
+from events.event_service import notify_change
+from sync import sync_repository, sync_service
 from . import role_repository, role_model
 
 def create_new_role(db: Session, role: role_model.RoleCreate):
-    db_role = role_repository.get_role_by_name(db, name=role.name)
-    if db_role:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Role name already exists")
-    return role_repository.create_role(db=db, role=role)
+    # A restrição UNIQUE do banco garante o nome único, sem SELECT prévio
+    # (que poderia perder a corrida para um INSERT concorrente)
+    try:
+        with unit_of_work(db):
+            db_role = role_repository.create_role(db=db, role=role)
+            notify_change(db, "role", db_role.id, "create", db_role.version)
+    except IntegrityError as e:
+        db.rollback()
+        if is_unique_violation(e):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Role name already exists")
+        raise
+    return db_role
 
 def get_all(db: Session):
     return role_repository.get_all_roles(db)
 
+def get_role_changes(db: Session, since: int, limit: int):
+    return sync_service.get_changes_page(db, role_model.Role, "role", since=since, limit=limit)
+
 def get_role_by_id(db: Session, role_id: int):
     db_role = role_repository.get_role_by_id(db, role_id=role_id)
     if db_role is None:
@@ -19,16 +34,45 @@ def get_role_by_id(db: Session, role_id: int):
     return db_role
 
 def update_existing_role(db: Session, role_id: int, role_in: role_model.RoleUpdate):
-    db_role = get_role_by_id(db, role_id)
-    
-    # Verificar se o novo nome já existe (se foi alterado)
-    if role_in.name != db_role.name:
-        existing_role = role_repository.get_role_by_name(db, name=role_in.name)
-        if existing_role:
+    try:
+        with unit_of_work(db):
+            db_role = role_repository.update_role(db=db, role_id=role_id, role_in=role_in)
+            if db_role is not None:
+                notify_change(db, "role", db_role.id, "update", db_role.version)
+    except IntegrityError as e:
+        db.rollback()
+        if is_unique_violation(e):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Role name already exists")
-    
-    return role_repository.update_role(db=db, db_role=db_role, role_in=role_in)
+        raise
+
+    if db_role is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Role not found")
+    return db_role
+
+def get_role_stats(db: Session):
+    """Membros por perfil e total, lidos dos contadores (sem COUNT na tabela de usuários)."""
+    roles = [role_model.RoleMemberStats(id=row.id, name=row.name, member_count=row.member_count)
+             for row in role_repository.get_role_stats(db)]
+    return role_model.RoleStats(total_users=sum(role.member_count for role in roles), roles=roles)
+
+def _role_in_use():
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Role still has members")
 
 def delete_role_by_id(db: Session, role_id: int):
     db_role = get_role_by_id(db, role_id)
-    return role_repository.delete_role(db=db, db_role=db_role)
\ No newline at end of file
+    try:
+        with unit_of_work(db):
+            # O contador é lido com FOR UPDATE: um cadastro concorrente neste
+            # perfil espera o fim da exclusão (e então falha pela chave estrangeira)
+            if role_repository.get_member_count(db, role_id, for_update=True) > 0:
+                raise _role_in_use()
+            role_repository.delete_role(db=db, db_role=db_role)
+            version = sync_repository.create_tombstone(db, "role", role_id)
+            notify_change(db, "role", role_id, "delete", version)
+    except IntegrityError as e:
+        # Contador desatualizado: a chave estrangeira de users ainda barra a exclusão
+        db.rollback()
+        if is_foreign_key_violation(e):
+            raise _role_in_use()
+        raise
+    return db_role
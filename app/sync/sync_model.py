@@ -0,0 +1,20 @@
+# sync/sync_model.py
+from sqlalchemy import BigInteger, Column, Integer, String, Index
+from database import Base
+from events.event_model import change_version_seq
+
+# Modelo da Tabela SQLAlchemy
+# Marca de exclusão ("tombstone"): registra que um registro foi apagado e em
+# qual versão, para que clientes em sincronização incremental removam sua cópia.
+class Tombstone(Base):
+    __tablename__ = "tombstones"
+    __table_args__ = (
+        Index("ix_tombstones_entity_version", "entity", "version"),
+        {'extend_existing': True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)   # "user" ou "role"
+    entity_id = Column(Integer, nullable=False)
+    version = Column(BigInteger, change_version_seq, nullable=False,
+                     server_default=change_version_seq.next_value())
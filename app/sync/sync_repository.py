@@ -0,0 +1,41 @@
+# sync/sync_repository.py
+from sqlalchemy import and_, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+from .sync_model import Tombstone
+
+def create_tombstone(db: Session, entity: str, entity_id: int) -> int:
+    """Registra a exclusão de um registro e devolve a versão atribuída a ela."""
+    stmt = (insert(Tombstone)
+            .values(entity=entity, entity_id=entity_id)
+            .returning(Tombstone.version))
+    return db.scalar(stmt)
+
+def create_tombstones(db: Session, entity: str, entity_ids: list[int]) -> dict[int, int]:
+    """Versão em lote de `create_tombstone`: devolve {id do registro: versão}."""
+    if not entity_ids:
+        return {}
+    stmt = (insert(Tombstone)
+            .values([{"entity": entity, "entity_id": entity_id} for entity_id in entity_ids])
+            .returning(Tombstone.entity_id, Tombstone.version))
+    return dict(db.execute(stmt).all())
+
+def get_changes(db: Session, model, entity: str, since: int, limit: int):
+    """
+    Busca as mudanças de uma entidade com versão maior que `since`.
+
+    Retorna até `limit` linhas (version, entity_id, deleted, registro), ordenadas
+    pela versão; `registro` é None nas exclusões. Alterações e tombstones vêm
+    de uma única consulta, e portanto do mesmo snapshot: duas consultas
+    separadas poderiam ver um commit feito entre elas só em uma das listas.
+    """
+    changed = (select(model.version, model.id.label("entity_id"), literal(False).label("deleted"))
+               .where(model.version > since).order_by(model.version).limit(limit))
+    deleted = (select(Tombstone.version, Tombstone.entity_id, literal(True).label("deleted"))
+               .where(Tombstone.entity == entity, Tombstone.version > since)
+               .order_by(Tombstone.version).limit(limit))
+    changes = union_all(changed, deleted).subquery()
+    stmt = (select(changes.c.version, changes.c.entity_id, changes.c.deleted, model)
+            .outerjoin(model, and_(model.id == changes.c.entity_id, changes.c.deleted.is_(False)))
+            .order_by(changes.c.version)
+            .limit(limit))
+    return db.execute(stmt).all()
@@ -0,0 +1,30 @@
+# sync/sync_service.py
+from sqlalchemy.orm import Session
+from . import sync_repository
+
+MAX_PAGE_SIZE = 1000
+
+def get_changes_page(db: Session, model, entity: str, since: int, limit: int) -> dict:
+    """
+    Monta uma página de sincronização incremental.
+
+    Traz registros alterados e exclusões em ordem de versão, até `limit` itens,
+    e a nova marca d'água (`version`): o cliente guarda esse valor e o envia
+    como `since` na próxima chamada, repetindo enquanto `has_more`.
+
+    As versões definitivas são atribuídas no commit, sob um lock (ver
+    `event_service._stamp_versions`), então ficam visíveis em ordem: nenhuma
+    transação ainda em andamento pode gravar uma versão menor ou igual à
+    marca d'água devolvida.
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    # Busca um item a mais para saber se há outra página
+    changes = sync_repository.get_changes(db, model, entity, since, limit + 1)
+    has_more = len(changes) > limit
+    page = changes[:limit]
+    return {
+        "items": [record for _, _, deleted, record in page if not deleted],
+        "deleted": [entity_id for _, entity_id, deleted, _ in page if deleted],
+        "version": page[-1].version if page else since,
+        "has_more": has_more,
+    }
@@ -1,14 +1,17 @@
 # app/users/user_controller.py
 
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 from typing import List
 from database import SessionLocal, get_db
 from . import user_service, user_model
-from auth.auth_service import get_current_user
+from images.image_job_model import ImageStatus
+from utils.content_negotiation import NegotiatedRoute
+from auth.auth_service import get_current_user, require_role
 
 router = APIRouter(
     prefix="/users",
+    route_class=NegotiatedRoute,
     tags=["Users"],
     dependencies=[Depends(get_current_user)]
 )
@@ -24,11 +27,38 @@ def read_users(db: Session = Depends(get_db)):
     """Endpoint para listar todos os usuários."""
     return user_service.get_all_users(db)
 
+@router.get("/changes", response_model=user_model.UserChanges)
+def read_user_changes(since: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000),
+                      db: Session = Depends(get_db)):
+    """Endpoint de sincronização incremental: devolve apenas os usuários criados,
+    alterados ou excluídos depois da versão `since`, e a nova marca d'água."""
+    return user_service.get_user_changes(db, since=since, limit=limit)
+
+@router.patch("/bulk", response_model=user_model.UserBulkResult,
+              dependencies=[Depends(require_role("admin"))])
+def bulk_update_users(bulk: user_model.UserBulkUpdate, dry_run: bool = False, db: Session = Depends(get_db)):
+    """Endpoint para alterar vários usuários de uma vez (ex.: trocar o perfil de uma turma).
+    Com `dry_run=true` só informa quantos e quais usuários seriam alterados."""
+    return user_service.bulk_update_users(db, bulk, dry_run=dry_run)
+
+@router.delete("/bulk", response_model=user_model.UserBulkResult,
+               dependencies=[Depends(require_role("admin"))])
+def bulk_delete_users(criteria: user_model.UserBulkFilter, dry_run: bool = False, db: Session = Depends(get_db)):
+    """Endpoint para excluir vários usuários de uma vez (ex.: alunos formados).
+    Com `dry_run=true` só informa quantos e quais usuários seriam excluídos."""
+    return user_service.bulk_delete_users(db, criteria, dry_run=dry_run)
+
 @router.get("/{user_id}", response_model=user_model.UserPublic)
 def read_user(user_id: int, db: Session = Depends(get_db)):
     """Endpoint para buscar um usuário pelo ID."""
     return user_service.get_user_by_id(db, user_id=user_id)
 
+@router.get("/{user_id}/image-status", response_model=ImageStatus)
+def read_user_image_status(user_id: int, db: Session = Depends(get_db)):
+    """Endpoint para acompanhar o processamento da imagem de perfil
+    (none, pending, ready ou failed)."""
+    return user_service.get_image_status(db, user_id=user_id)
+
 @router.put("/{user_id}", response_model=user_model.UserPublic)
 def update_user(user_id: int, user: user_model.UserUpdate, db: Session = Depends(get_db)):
     """Endpoint para atualizar um usuário."""
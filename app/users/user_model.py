@@ -1,10 +1,11 @@
 # users/user_model.py
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, Text
 from sqlalchemy.orm import relationship
-from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_validator
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_validator, model_validator
 from database import Base
 from roles.role_model import RolePublic # Importa o schema público de Role
-from typing import Optional
+from events.event_model import change_version_seq
+from typing import List, Optional
 
 # ==================================
 # MODELO DA TABELA (SQLAlchemy)
@@ -19,10 +20,17 @@ class User(Base):
     full_name = Column(String, index=True, nullable=True)
     profile_image_url = Column(String, nullable=True)
     profile_image_base64 = Column(Text, nullable=True)
+    # Situação da imagem de perfil: none, pending (na fila), ready ou failed
+    image_status = Column(String, nullable=False, default="none", server_default="none")
     # Chave estrangeira que aponta para a tabela 'roles'
     role_id = Column(Integer, ForeignKey("roles.id"))
     # Cria a relação para que possamos acessar o objeto Role a partir de um User
     role = relationship("Role")
+    # Versão da última mudança (sequência global change_version_seq), renovada
+    # a cada INSERT/UPDATE; usada na sincronização incremental (/users/changes)
+    version = Column(BigInteger, change_version_seq, nullable=False, index=True,
+                     server_default=change_version_seq.next_value(),
+                     onupdate=change_version_seq.next_value())
 
 # ==================================
 # SCHEMAS (Pydantic)
@@ -48,4 +56,53 @@ class UserPublic(BaseModel):
     full_name: str | None = None
     profile_image_url: Optional[str] = None
     profile_image_base64: Optional[str] = None
+    image_status: str = "none"
     role: RolePublic # O perfil agora é um objeto aninhado
+
+class UserVersioned(UserPublic):
+    version: int
+
+class UserChanges(BaseModel):
+    """Página de sincronização incremental de usuários."""
+    items: List[UserVersioned]   # criados ou alterados depois de `since`
+    deleted: List[int]           # IDs excluídos depois de `since`
+    version: int                 # nova marca d'água: enviar como `since` na próxima chamada
+    has_more: bool
+
+# --- Operações em lote (/users/bulk) ---
+
+class UserBulkFilter(BaseModel):
+    """Seleção dos usuários de uma operação em lote. Os critérios são combinados com AND."""
+    ids: List[int] | None = Field(default=None, min_length=1, max_length=10_000)
+    role_id: int | None = None
+    email_suffix: str | None = Field(default=None, min_length=2, description="Ex.: @aluno.ifg.edu.br")
+
+    @model_validator(mode="after")
+    def _require_criteria(self):
+        # Sem critério a operação atingiria a tabela inteira
+        if self.ids is None and self.role_id is None and self.email_suffix is None:
+            raise ValueError("Informe ao menos um critério: ids, role_id ou email_suffix")
+        return self
+
+class UserBulkChanges(BaseModel):
+    """Campos de UserUpdate aplicáveis em lote, mais a troca de perfil."""
+    full_name: str | None = Field(default=None, min_length=3)
+    profile_image_url: Optional[str] = None
+    role_id: int | None = None
+
+    @model_validator(mode="after")
+    def _require_changes(self):
+        if not self.model_fields_set:
+            raise ValueError("Informe ao menos um campo a alterar")
+        if "role_id" in self.model_fields_set and self.role_id is None:
+            raise ValueError("role_id não pode ser nulo")
+        return self
+
+class UserBulkUpdate(BaseModel):
+    filter: UserBulkFilter
+    changes: UserBulkChanges
+
+class UserBulkResult(BaseModel):
+    dry_run: bool
+    count: int        # usuários afetados (ou que seriam afetados, no dry run)
+    ids: List[int]
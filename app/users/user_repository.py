@@ -1,7 +1,10 @@
 # app/users/user_repository.py
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session, joinedload
 from . import user_model
+from database import commit
+from roles import role_model, role_repository
 from security import get_password_hash
 
 # --- FUNÇÕES DE LEITURA (READ) ---
@@ -16,8 +19,29 @@ def get_user(db: Session, user_id: int):
     return db.query(user_model.User).filter(user_model.User.id == user_id).first()
 
 def get_user_by_email(db: Session, email: str):
-    """Busca um único usuário pelo seu e-mail."""
-    return db.query(user_model.User).filter(user_model.User.email == email).first()
+    """
+    Busca um único usuário pelo seu e-mail, já com o perfil (JOIN): o login
+    sempre usa `user.role`.
+    """
+    return (db.query(user_model.User)
+            .options(joinedload(user_model.User.role))
+            .filter(user_model.User.email == email)
+            .first())
+
+def get_principal_by_email(db: Session, email: str):
+    """
+    Busca só o que a autenticação por token usa: id, e-mail e nome do perfil
+    (sem a imagem nem o hash da senha). Retorna None se o e-mail não existir.
+    """
+    return db.execute(
+        select(user_model.User.id, user_model.User.email, role_model.Role.name.label("role_name"))
+        .outerjoin(role_model.Role, role_model.Role.id == user_model.User.role_id)
+        .where(user_model.User.email == email)
+    ).first()
+
+def get_user_image_status(db: Session, user_id: int):
+    """Busca só o image_status do usuário (None se ele não existir)."""
+    return db.scalar(select(user_model.User.image_status).where(user_model.User.id == user_id))
 
 def get_users(db: Session):
     """
@@ -28,50 +52,150 @@ def get_users(db: Session):
 
 # --- FUNÇÃO DE CRIAÇÃO (CREATE) ---
 
-def create_user(db: Session, user: user_model.UserCreate, role_id: int = None):
+def create_user(db: Session, user: user_model.UserCreate, role_id: int = None, image_status: str = "none"):
     """
     Cria um novo usuário no banco de dados.
     """
     # Agora a senha é hasheada corretamente
     hashed_password = get_password_hash(user.password)
 
-    # Cria uma instância do modelo SQLAlchemy com os dados do schema Pydantic.
-    # É aqui que os dados da API são transformados em um objeto que pode ser salvo no banco.
-    db_user = user_model.User(
-        email=user.email, 
-        hashed_password=hashed_password, 
+    # Monta um INSERT ... RETURNING com os dados do schema Pydantic.
+    # Em uma única ida ao banco o registro é gravado e devolvido já com o ID
+    # gerado, sem o db.refresh() (SELECT) que vinha depois do commit.
+    # E-mail duplicado gera IntegrityError (restrição UNIQUE), tratada no serviço.
+    stmt = insert(user_model.User).values(
+        email=user.email,
+        hashed_password=hashed_password,
         full_name=user.full_name,
         profile_image_url=user.profile_image_url,
         profile_image_base64=user.profile_image_base64,
+        image_status=image_status,
         role_id=role_id
-    )
+    ).returning(user_model.User)
 
-    db.add(db_user)      # Adiciona o novo objeto à sessão (área de preparação).
-    db.commit()         # Salva (commita) as mudanças no banco de dados.
-    db.refresh(db_user) # Atualiza o objeto db_user com os dados do banco (como o ID gerado).
+    db_user = db.scalars(stmt).one()
+    # O contador de membros do perfil é atualizado na mesma transação
+    if role_id is not None:
+        role_repository.adjust_member_count(db, role_id, 1)
+    commit(db)          # Salva (commita) as mudanças, exceto dentro de unit_of_work.
     return db_user
 
 # --- FUNÇÃO DE ATUALIZAÇÃO (UPDATE) ---
 
-def update_user(db: Session, db_user: user_model.User, user_in: user_model.UserUpdate):
-    """Atualiza os dados de um usuário existente."""
+def update_user(db: Session, user_id: int, user_in: user_model.UserUpdate, **extra_values):
+    """
+    Atualiza os dados de um usuário existente com UPDATE ... RETURNING.
+    `extra_values` são colunas definidas pelo sistema (ex.: image_status).
+    Retorna None se nenhum usuário tiver o ID informado.
+    """
     update_data = user_in.model_dump(exclude_unset=True) # Pega só os campos que foram enviados na requisição.
-    for key, value in update_data.items():
-        # Se o campo for 'password', precisa mapear para 'hashed_password' no modelo SQLAlchemy
-        if key == "password":
-            setattr(db_user, "hashed_password", value) # AVISO: A senha ainda não está sendo hasheada!
-        else:
-            setattr(db_user, key, value) # Atualiza cada campo no objeto do banco (db_user).
-
-    db.add(db_user) # Adiciona o objeto modificado à sessão.
-    db.commit()     # Salva as alterações.
-    db.refresh(db_user) # Atualiza o objeto com os dados do banco.
+    update_data.update(extra_values)
+    # Se o campo for 'password', precisa mapear para 'hashed_password' no modelo SQLAlchemy
+    if "password" in update_data:
+        update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+    if not update_data:
+        return get_user(db, user_id)
+
+    # Troca de perfil: o perfil anterior é lido com FOR UPDATE para mover o contador
+    old_role_id = None
+    if "role_id" in update_data:
+        old_role_id = db.scalar(select(user_model.User.role_id)
+                                .where(user_model.User.id == user_id).with_for_update())
+
+    stmt = (update(user_model.User)
+            .where(user_model.User.id == user_id)
+            .values(**update_data)
+            .returning(user_model.User))
+    db_user = db.scalars(stmt).one_or_none()
+    if db_user is not None and "role_id" in update_data and old_role_id != db_user.role_id:
+        if old_role_id is not None:
+            role_repository.adjust_member_count(db, old_role_id, -1)
+        if db_user.role_id is not None:
+            role_repository.adjust_member_count(db, db_user.role_id, 1)
+    commit(db)     # Salva as alterações.
     return db_user
 
 # --- FUNÇÃO DE DELEÇÃO (DELETE) ---
 
 def delete_user(db: Session, db_user: user_model.User):
     """Deleta um usuário do banco de dados."""
-    db.delete(db_user) # Marca o objeto para deleção.
-    db.commit()        # Efetiva a deleção no banco.
-    return db_user
\ No newline at end of file
+    # DELETE ... RETURNING devolve o perfil gravado no momento da exclusão,
+    # que é o contador a decrementar (mesmo que o objeto em memória esteja desatualizado)
+    role_id = db.scalar(delete(user_model.User)
+                        .where(user_model.User.id == db_user.id)
+                        .returning(user_model.User.role_id))
+    if role_id is not None:
+        role_repository.adjust_member_count(db, role_id, -1)
+    commit(db)         # Efetiva a deleção no banco.
+    return db_user
+
+# --- OPERAÇÕES EM LOTE ---
+
+def _bulk_criteria(criteria: user_model.UserBulkFilter):
+    """Converte o filtro do lote em condições do WHERE."""
+    conditions = []
+    if criteria.ids is not None:
+        conditions.append(user_model.User.id.in_(criteria.ids))
+    if criteria.role_id is not None:
+        conditions.append(user_model.User.role_id == criteria.role_id)
+    if criteria.email_suffix is not None:
+        conditions.append(user_model.User.email.endswith(criteria.email_suffix, autoescape=True))
+    return conditions
+
+def find_user_ids(db: Session, criteria: user_model.UserBulkFilter) -> list[int]:
+    """IDs dos usuários que uma operação em lote atingiria (dry run)."""
+    return list(db.scalars(
+        select(user_model.User.id).where(*_bulk_criteria(criteria)).order_by(user_model.User.id)
+    ))
+
+def bulk_update_users(db: Session, criteria: user_model.UserBulkFilter,
+                      changes: user_model.UserBulkChanges) -> list:
+    """
+    Atualiza todos os usuários do filtro com um único UPDATE ... RETURNING.
+
+    As linhas são travadas e o perfil anterior é lido na mesma instrução
+    (CTE com FOR UPDATE), para mover os contadores de membros.
+    Retorna as linhas (id, email, version, old_role_id, role_id).
+    """
+    old = (select(user_model.User.id, user_model.User.role_id)
+           .where(*_bulk_criteria(criteria))
+           .with_for_update()
+           .cte("old"))
+    stmt = (update(user_model.User)
+            .where(user_model.User.id == old.c.id)
+            .values(**changes.model_dump(exclude_unset=True))
+            .returning(user_model.User.id, user_model.User.email, user_model.User.version,
+                       old.c.role_id.label("old_role_id"), user_model.User.role_id)
+            # As linhas vêm do RETURNING: não há objetos na sessão a sincronizar
+            .execution_options(synchronize_session=False))
+    rows = db.execute(stmt).all()
+
+    deltas = {}
+    for row in rows:
+        if row.old_role_id != row.role_id:
+            if row.old_role_id is not None:
+                deltas[row.old_role_id] = deltas.get(row.old_role_id, 0) - 1
+            if row.role_id is not None:
+                deltas[row.role_id] = deltas.get(row.role_id, 0) + 1
+    role_repository.adjust_member_counts(db, deltas)
+    commit(db)
+    return rows
+
+def bulk_delete_users(db: Session, criteria: user_model.UserBulkFilter) -> list:
+    """
+    Exclui todos os usuários do filtro com um único DELETE ... RETURNING.
+    Retorna as linhas (id, email, role_id) excluídas.
+    """
+    stmt = (delete(user_model.User)
+            .where(*_bulk_criteria(criteria))
+            .returning(user_model.User.id, user_model.User.email, user_model.User.role_id)
+            .execution_options(synchronize_session=False))
+    rows = db.execute(stmt).all()
+
+    deltas = {}
+    for row in rows:
+        if row.role_id is not None:
+            deltas[row.role_id] = deltas.get(row.role_id, 0) - 1
+    role_repository.adjust_member_counts(db, deltas)
+    commit(db)
+    return rows
@@ -1,28 +1,46 @@
 # app/users/user_service.py
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
+from auth.auth_service import forget_principal
+from database import is_foreign_key_violation, is_unique_violation, unit_of_work
+from events.event_service import notify_change
+from images import image_job_repository
+from images.image_job_model import ImageStatus
+from sync import sync_repository, sync_service
 from . import user_repository, user_model
-from utils.image_processor import process_image_base64
 
-def create_new_user(db: Session, user: user_model.UserCreate):
-    db_user = user_repository.get_user_by_email(db, email=user.email)
-    if db_user:
+def _raise_for_integrity_error(db: Session, e: IntegrityError):
+    """Converte violações de restrição do banco em erros 400 da API."""
+    db.rollback()
+    if is_unique_violation(e):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+    if is_foreign_key_violation(e):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Role not found")
+    raise e
+
+def create_new_user(db: Session, user: user_model.UserCreate):
+    # O e-mail único é garantido pela restrição UNIQUE do banco (ver
+    # _raise_for_integrity_error), sem SELECT prévio sujeito a corrida.
+
+    # A imagem não é processada aqui: o usuário é criado com image_status
+    # "pending" e a conversão (AVIF -> JPEG etc.) entra na fila de imagens,
+    # na mesma transação. O tempo de resposta não depende do tamanho da imagem.
+    image = user.profile_image_base64
+    user_data = user.model_copy(update={"profile_image_base64": None})
 
-    # Processa a imagem se fornecida (converte AVIF para JPEG automaticamente)
     try:
-        processed_image = process_image_base64(user.profile_image_base64)
-        # Cria uma cópia dos dados do usuário com a imagem processada
-        user_data = user.model_copy()
-        user_data.profile_image_base64 = processed_image
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, 
-            detail=f"Erro no processamento da imagem: {e}"
-        )
-
-    return user_repository.create_user(db=db, user=user_data, role_id=user.role_id)
+        # A notificação do feed de eventos é gravada na mesma transação do INSERT
+        with unit_of_work(db):
+            db_user = user_repository.create_user(db=db, user=user_data, role_id=user.role_id,
+                                                  image_status="pending" if image else "none")
+            if image:
+                image_job_repository.enqueue(db, db_user.id, image)
+            notify_change(db, "user", db_user.id, "create", db_user.version)
+    except IntegrityError as e:
+        _raise_for_integrity_error(db, e)
+    return db_user
 
 def get_all_users(db: Session):
     """Serviço para listar todos os usuários. Neste caso, apenas repassa a chamada."""
@@ -38,26 +56,95 @@ def get_user_by_id(db: Session, user_id: int):
 
 def update_existing_user(db: Session, user_id: int, user_in: user_model.UserUpdate):
     """Serviço para atualizar um usuário, com tratamento de erro."""
-    db_user = get_user_by_id(db, user_id) # Reutiliza a lógica para buscar e checar se o usuário existe.
-    
-    # Processa a imagem se fornecida (converte AVIF para JPEG automaticamente)
-    if user_in.profile_image_base64:
-        try:
-            processed_image = process_image_base64(user_in.profile_image_base64)
-            # Cria uma cópia dos dados com a imagem processada
-            user_data = user_in.model_copy()
-            user_data.profile_image_base64 = processed_image
-        except ValueError as e:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, 
-                detail=f"Erro no processamento da imagem: {e}"
-            )
-    else:
-        user_data = user_in
-    
-    return user_repository.update_user(db=db, db_user=db_user, user_in=user_data)
+    # Uma nova imagem vai para a fila de processamento (ver create_new_user);
+    # enviar a imagem vazia/nula apenas remove a atual.
+    image = user_in.profile_image_base64
+    extra_values = {}
+    if "profile_image_base64" in user_in.model_fields_set:
+        extra_values["image_status"] = "pending" if image else "none"
+    user_data = user_model.UserUpdate(**user_in.model_dump(exclude_unset=True, exclude={"profile_image_base64"}))
+    if not image and "profile_image_base64" in user_in.model_fields_set:
+        user_data.profile_image_base64 = None
+
+    try:
+        with unit_of_work(db):
+            db_user = user_repository.update_user(db=db, user_id=user_id, user_in=user_data, **extra_values)
+            if db_user is not None:
+                if image:
+                    image_job_repository.enqueue(db, db_user.id, image)
+                elif "profile_image_base64" in user_in.model_fields_set:
+                    # Imagem removida: um job pendente ou em andamento não a grava de volta
+                    image_job_repository.supersede_pending(db, db_user.id)
+                notify_change(db, "user", db_user.id, "update", db_user.version)
+    except IntegrityError as e:
+        _raise_for_integrity_error(db, e)
+    # REGRA DE NEGÓCIO: Se o usuário não for encontrado, retornar um erro 404.
+    if db_user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # O principal em cache é recarregado na próxima autenticação: com o banco
+    # fora, nenhuma versão anterior do usuário (ex.: outro perfil) é servida
+    forget_principal(db_user.email)
+    return db_user
 
 def delete_user_by_id(db: Session, user_id: int):
     """Serviço para deletar um usuário, com tratamento de erro."""
     db_user = get_user_by_id(db, user_id) # Reutiliza a lógica para buscar e checar se o usuário existe.
-    return user_repository.delete_user(db=db, db_user=db_user)
\ No newline at end of file
+    with unit_of_work(db):
+        user_repository.delete_user(db=db, db_user=db_user)
+        version = sync_repository.create_tombstone(db, "user", user_id)
+        notify_change(db, "user", user_id, "delete", version)
+    forget_principal(db_user.email)
+    return db_user
+
+def get_user_changes(db: Session, since: int, limit: int):
+    """Serviço de sincronização incremental: usuários alterados/excluídos depois de `since`."""
+    return sync_service.get_changes_page(db, user_model.User, "user", since=since, limit=limit)
+
+def get_image_status(db: Session, user_id: int) -> ImageStatus:
+    """Serviço para consultar o processamento da imagem de perfil de um usuário."""
+    db_user = get_user_by_id(db, user_id)
+    job = image_job_repository.get_latest_job(db, user_id)
+    return ImageStatus(
+        user_id=db_user.id,
+        image_status=db_user.image_status,
+        attempts=job.attempts if job else 0,
+        last_error=job.last_error if job else None,
+    )
+
+def bulk_update_users(db: Session, bulk: user_model.UserBulkUpdate, dry_run: bool = False):
+    """
+    Serviço de atualização em lote. Um único UPDATE em uma transação; cada
+    usuário alterado ganha nova versão e um evento no feed de mudanças, o que
+    invalida o que os clientes tiverem em cache (sincronização e SSE).
+    """
+    if dry_run:
+        ids = user_repository.find_user_ids(db, bulk.filter)
+        return user_model.UserBulkResult(dry_run=True, count=len(ids), ids=ids)
+    try:
+        with unit_of_work(db):
+            rows = user_repository.bulk_update_users(db, bulk.filter, bulk.changes)
+            for row in rows:
+                notify_change(db, "user", row.id, "update", row.version)
+    except IntegrityError as e:
+        _raise_for_integrity_error(db, e)
+    if "role_id" in bulk.changes.model_fields_set:
+        # Quem mudou de perfil não pode continuar com o anterior no cache de principals
+        for row in rows:
+            forget_principal(row.email)
+    ids = sorted(row.id for row in rows)
+    return user_model.UserBulkResult(dry_run=False, count=len(ids), ids=ids)
+
+def bulk_delete_users(db: Session, criteria: user_model.UserBulkFilter, dry_run: bool = False):
+    """Serviço de exclusão em lote: um único DELETE, com tombstones e eventos de cada usuário."""
+    if dry_run:
+        ids = user_repository.find_user_ids(db, criteria)
+        return user_model.UserBulkResult(dry_run=True, count=len(ids), ids=ids)
+    with unit_of_work(db):
+        rows = user_repository.bulk_delete_users(db, criteria)
+        versions = sync_repository.create_tombstones(db, "user", [row.id for row in rows])
+        for user_id, version in versions.items():
+            notify_change(db, "user", user_id, "delete", version)
+    for row in rows:
+        forget_principal(row.email)
+    ids = sorted(row.id for row in rows)
+    return user_model.UserBulkResult(dry_run=False, count=len(ids), ids=ids)
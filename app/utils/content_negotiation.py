@@ -0,0 +1,189 @@
+# app/utils/content_negotiation.py
+import base64
+from contextvars import ContextVar
+from typing import Any, Callable
+
+import msgpack
+from fastapi import HTTPException, Request, Response, status
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+from .image_processor import detect_image_mime_type, parse_data_url
+
+# CBOR é opcional: só é oferecido com o pacote cbor2 instalado (extra "cbor")
+try:
+    import cbor2
+except ImportError:  # pragma: no cover - depende do ambiente
+    cbor2 = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+# Aliases aceitos para cada formato (Accept e Content-Type)
+_MEDIA_TYPES = {
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/cbor": CBOR,
+}
+
+# Campos com imagem em Data URL: nos formatos binários trafegam como bytes crus
+IMAGE_FIELDS = {"profile_image_base64"}
+
+
+def _encoders() -> dict[str, Callable[[Any], bytes]]:
+    encoders = {MSGPACK: lambda content: msgpack.packb(content, use_bin_type=True)}
+    if cbor2 is not None:
+        encoders[CBOR] = cbor2.dumps
+    return encoders
+
+
+def _decoders() -> dict[str, Callable[[bytes], Any]]:
+    decoders = {MSGPACK: lambda body: msgpack.unpackb(body, raw=False)}
+    if cbor2 is not None:
+        decoders[CBOR] = cbor2.loads
+    return decoders
+
+
+def _media_type(header_value: str) -> str:
+    return header_value.split(";", 1)[0].strip().lower()
+
+
+def negotiate(accept: str | None) -> str:
+    """
+    Escolhe o formato da resposta pelo cabeçalho Accept (com q-values).
+    Sem Accept, com */* ou sem nenhum formato suportado, a resposta é JSON.
+    """
+    if not accept:
+        return JSON
+    ranges = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.append((-q, position, media_type.lower()))
+    available = _encoders()
+    for negative_q, _, media_type in sorted(ranges):
+        if negative_q == 0:
+            break
+        if media_type in (JSON, "*/*", "application/*"):
+            return JSON
+        canonical = _MEDIA_TYPES.get(media_type)
+        if canonical in available:
+            return canonical
+    return JSON
+
+
+def _images_to_bytes(content: Any) -> Any:
+    """Troca as imagens em Data URL (base64) pelos bytes da imagem."""
+    if isinstance(content, list):
+        return [_images_to_bytes(item) for item in content]
+    if isinstance(content, dict):
+        converted = {}
+        for key, value in content.items():
+            if key in IMAGE_FIELDS and isinstance(value, str):
+                try:
+                    value = parse_data_url(value)[1]
+                except ValueError:
+                    pass  # não é um Data URL: vai como está
+            converted[key] = _images_to_bytes(value)
+        return converted
+    return content
+
+
+def _images_to_data_urls(content: Any) -> Any:
+    """Inverso de `_images_to_bytes`, para corpos recebidos em formato binário."""
+    if isinstance(content, list):
+        return [_images_to_data_urls(item) for item in content]
+    if isinstance(content, dict):
+        converted = {}
+        for key, value in content.items():
+            if key in IMAGE_FIELDS and isinstance(value, (bytes, bytearray)):
+                value = f"data:{detect_image_mime_type(value)};base64,{base64.b64encode(value).decode()}"
+            converted[key] = _images_to_data_urls(value)
+        return converted
+    return content
+
+
+async def _as_json_request(request: Request, decode: Callable[[bytes], Any]) -> Request:
+    """
+    Decodifica um corpo MessagePack/CBOR e devolve a requisição como se tivesse
+    chegado em JSON, para que o FastAPI valide com os mesmos modelos.
+    """
+    body = await request.body()
+    try:
+        content = _images_to_data_urls(decode(body)) if body else None
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed request body")
+    scope = dict(request.scope)
+    scope["headers"] = [(name, value) for name, value in request.scope["headers"] if name != b"content-type"]
+    scope["headers"].append((b"content-type", JSON.encode()))
+    json_request = Request(scope, request.receive)
+    json_request._body = body
+    json_request._json = content
+    return json_request
+
+
+# Formato negociado para a requisição em andamento (definido pela NegotiatedRoute)
+_response_media_type: ContextVar[str] = ContextVar("response_media_type", default=JSON)
+
+
+class NegotiatedResponse(JSONResponse):
+    """
+    Resposta padrão das rotas com NegotiatedRoute.
+
+    O FastAPI entrega o conteúdo já validado pelo response_model e passado
+    pelo jsonable_encoder; ele é codificado direto no formato negociado, sem
+    gerar (e reler) um JSON intermediário.
+    """
+
+    def render(self, content: Any) -> bytes:
+        media_type = _response_media_type.get()
+        if media_type == JSON:
+            return super().render(content)
+        self.media_type = media_type
+        return _encoders()[media_type](_images_to_bytes(content))
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Rota que fala JSON, MessagePack ou CBOR conforme Accept/Content-Type.
+
+    A resposta é gerada e validada normalmente (response_model) e codificada
+    pela NegotiatedResponse; erros continuam em JSON. Nos formatos binários,
+    os campos de IMAGE_FIELDS vão como bytes em vez de Data URL base64.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], *,
+                 response_class: type[Response] | DefaultPlaceholder = Default(NegotiatedResponse), **kwargs):
+        # A resposta padrão do roteador (JSONResponse) dá lugar à negociada;
+        # uma response_class explícita na rota é mantida
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = Default(NegotiatedResponse)
+        super().__init__(path, endpoint, response_class=response_class, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request) -> Response:
+            decode = _decoders().get(_MEDIA_TYPES.get(_media_type(request.headers.get("content-type", ""))))
+            if decode is not None:
+                request = await _as_json_request(request, decode)
+
+            token = _response_media_type.set(negotiate(request.headers.get("accept")))
+            try:
+                response = await handler(request)
+            finally:
+                _response_media_type.reset(token)
+            response.headers.append("Vary", "Accept")
+            return response
+
+        return negotiated_handler
@@ -3,7 +3,6 @@ import base64
 import re
 import io
 from typing import Tuple, Optional
-from PIL import Image
 
 def parse_data_url(data_url: str) -> Tuple[str, bytes]:
     """
@@ -66,6 +65,10 @@ def convert_avif_to_jpeg(image_bytes: bytes, quality: int = 85) -> bytes:
     Raises:
         Exception: Se a conversão falhar
     """
+    # O PIL é importado só quando há conversão a fazer: a maioria dos
+    # processos (e das requisições) nunca precisa dele.
+    from PIL import Image
+
     try:
         # Abre a imagem com PIL
         image = Image.open(io.BytesIO(image_bytes))
@@ -174,4 +177,30 @@ def get_image_info(data_url: Optional[str]) -> dict:
             "size_kb": round(len(image_bytes) / 1024, 1)
         }
     except:
-        return {"type": "unknown", "size": 0, "format": "unknown"}
\ No newline at end of file
+        return {"type": "unknown", "size": 0, "format": "unknown"}
+
+
+def detect_image_mime_type(image_bytes: bytes) -> str:
+    """
+    Detecta o tipo MIME de uma imagem pela assinatura do arquivo
+    (usado quando a imagem chega em bytes, sem Data URL)
+
+    Args:
+        image_bytes: Bytes da imagem
+
+    Returns:
+        str: Tipo MIME ou 'application/octet-stream' se desconhecido
+    """
+    if image_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if image_bytes.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if image_bytes[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'image/webp'
+    if is_avif_format(image_bytes):
+        return 'image/avif'
+    if len(image_bytes) >= 12 and image_bytes[4:8] == b'ftyp' and image_bytes[8:12] in (b'heic', b'heix', b'mif1'):
+        return 'image/heic'
+    return 'application/octet-stream'
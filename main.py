@@ -1,62 +1,209 @@
+import time
+
+# Marca o início do import para medir o custo de inicialização (cold start)
+_IMPORT_STARTED = time.perf_counter()
+
+import logging
 import os
 import sys
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import OperationalError
 
 # Adiciona a pasta app ao Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
-# Importa primeiro a base e engine para evitar problemas de ordem
-from database import engine, Base
+from config import Settings, get_settings
+import database
 
-# Depois importa os controllers
+# Os controllers importam os modelos, que precisam estar registrados na Base
+# antes do create_all executado em database.init_engine
 from users import user_controller
-from roles import role_controller  
+from roles import role_controller
 from auth import auth_controller
+from events import event_controller
+from events.event_service import ChangeListener
+from roles.role_reconciler import MemberCountReconciler
+from observability import observability_controller
+from observability.memory_stats import MemoryTrackingMiddleware, memory_stats
+from observability.profiling_middleware import ProfilingMiddleware
+from observability.query_stats import QueryContextMiddleware, query_stats
+from images.image_worker import ImageWorker
+from resilience.degraded_mode import (
+    DegradedModeMiddleware,
+    database_unavailable_handler,
+    operational_error_handler,
+)
+from resilience.single_flight import SingleFlightMiddleware
+from resilience.stale_cache import StaleCache
+from auth.auth_service import principal_cache
+from idempotency.idempotency_middleware import IdempotencyMiddleware
+from idempotency.idempotency_store import create_store
+from rate_limit.load_monitor import LoadMonitor
+from rate_limit.rate_limit_middleware import RateLimitMiddleware
+from rate_limit.rate_limit_store import create_bucket_store
 
-# Configuração baseada no ambiente
-APP_PROFILE = os.getenv("APP_PROFILE", "DEV")
+logger = logging.getLogger(__name__)
 
-# Criar tabelas apenas em desenvolvimento
-if APP_PROFILE == "DEV":
-    Base.metadata.create_all(bind=engine)
+IMPORT_TIME_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
 
-# 1. Cria a instância principal da aplicação
-app = FastAPI(
-    title="API do Meu Projeto",
-    version="0.1.0"
-)
 
-# Configuração de CORS baseada no ambiente
-if APP_PROFILE == "DEV":
-    # Configuração permissiva para desenvolvimento
+def create_lifespan(settings: Settings):
+    """Cria o lifespan: a engine nasce no startup e é descartada no shutdown."""
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        started = time.perf_counter()
+        # Cria a engine (e, em DEV, as tabelas)
+        engine = database.init_engine(settings)
+        app.state.startup_timings = {
+            "import_ms": round(IMPORT_TIME_MS, 1),
+            "lifespan_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        logger.info("Startup concluído: %s", app.state.startup_timings)
+        app.state.load_monitor.start()
+        if settings.memory_tracking_enabled:
+            memory_stats.start(settings.memory_trace_frames)
+        # Repassa as notificações de mudança (LISTEN/NOTIFY) para o feed SSE
+        change_listener = ChangeListener()
+        if engine.dialect.name == "postgresql":
+            change_listener.start()
+        # Corrige periodicamente os contadores de membros por perfil
+        reconciler = None
+        if settings.role_count_reconcile_interval_seconds > 0 and engine.dialect.name == "postgresql":
+            reconciler = MemberCountReconciler(settings.role_count_reconcile_interval_seconds)
+            reconciler.start()
+        # Processa a fila de imagens de perfil (ou deixe para o worker.py)
+        image_worker = None
+        if settings.image_worker_in_process:
+            image_worker = ImageWorker(
+                lease_seconds=settings.image_job_lease_seconds,
+                max_attempts=settings.image_job_max_attempts,
+                backoff_seconds=settings.image_job_backoff_seconds,
+            )
+            image_worker.start()
+        yield
+        if image_worker is not None:
+            image_worker.stop()
+            image_worker.join()
+        if reconciler is not None:
+            reconciler.stop()
+        change_listener.stop()
+        if settings.memory_tracking_enabled:
+            memory_stats.stop()
+        await app.state.load_monitor.stop()
+        database.dispose_engine()
+    return lifespan
+
+
+def create_app(settings: Settings | None = None) -> FastAPI:
+    """
+    Fábrica da aplicação.
+
+    Monta a instância do FastAPI sem tocar no banco: a conexão é aberta pelo
+    lifespan (ou na primeira requisição), então importar este módulo é barato.
+    """
+    settings = settings or get_settings()
+
+    # 1. Cria a instância principal da aplicação
+    app = FastAPI(
+        title="API do Meu Projeto",
+        version="0.1.0",
+        lifespan=create_lifespan(settings),
+    )
+    app.state.settings = settings
+    app.state.load_monitor = LoadMonitor()
+
+    # Pico de memória (tracemalloc) das rotas marcadas, só quando habilitado
+    if settings.memory_tracking_enabled:
+        app.add_middleware(MemoryTrackingMiddleware, tracked_routes=settings.memory_tracked_routes)
+
+    # Estatísticas por fingerprint de SQL e log de consultas lentas com a rota de origem
+    query_stats.slow_query_ms = settings.slow_query_ms
+    app.add_middleware(QueryContextMiddleware)
+
+    # Profiling sob demanda (administradores) ou por amostragem
     app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],
-        allow_credentials=False,
-        allow_methods=["*"],
-        allow_headers=["*"],
+        ProfilingMiddleware,
+        profile_dir=settings.profile_dir,
+        sample_rate=settings.profile_sample_rate,
+        interval=settings.profile_interval_ms / 1000,
     )
-else:
-    # Configuração para produção
+
+    # Respostas de POST/PUT com Idempotency-Key são registradas e reaproveitadas
+    app.add_middleware(IdempotencyMiddleware, store=create_store(settings))
+
+    # GETs idênticos e simultâneos (mesma rota, parâmetros e perfil, ou mesmo
+    # usuário nas rotas não compartilhadas) esperam a execução em andamento e
+    # recebem o mesmo corpo
+    if settings.single_flight_enabled:
+        app.add_middleware(
+            SingleFlightMiddleware,
+            routes=settings.single_flight_routes,
+            shared_routes=settings.single_flight_shared_routes,
+            max_wait=settings.single_flight_max_wait_ms / 1000,
+        )
+
+    # Banco fora do ar (circuit breaker aberto): escritas recebem 503 na hora e
+    # as leituras marcadas usam a última resposta boa (Warning/Age)
+    app.add_exception_handler(database.DatabaseUnavailable, database_unavailable_handler)
+    app.add_exception_handler(OperationalError, operational_error_handler)
+    principal_cache.max_age_seconds = settings.degraded_cache_max_age_seconds
     app.add_middleware(
-        CORSMiddleware,
-        allow_origins=[
-            "https://programacaoiii-front-1.onrender.com",
-            "https://programacaoiii-front-1.onrender.com/",
-        ],
-        allow_credentials=True,
-        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        allow_headers=["*"],
+        DegradedModeMiddleware,
+        routes=settings.degraded_cache_routes,
+        cache=StaleCache(settings.degraded_cache_max_entries, settings.degraded_cache_max_age_seconds,
+                         max_bytes=settings.degraded_cache_max_bytes),
     )
 
-# 2. Inclui o roteador de usuários na aplicação principal
-app.include_router(user_controller.router)
-app.include_router(role_controller.router)
-app.include_router(auth_controller.router)
+    # Rate limiting e load shedding ficam antes dos demais middlewares para
+    # rejeitar o excesso antes de qualquer trabalho de banco ou CPU
+    if settings.rate_limit_enabled:
+        app.add_middleware(
+            RateLimitMiddleware,
+            store=create_bucket_store(settings),
+            monitor=app.state.load_monitor,
+            max_loop_lag_ms=settings.load_shed_max_loop_lag_ms,
+            max_queue_depth=settings.load_shed_max_queue_depth,
+            store_in_threadpool=settings.rate_limit_backend == "database",
+            trusted_proxies=settings.trusted_proxies,
+        )
+
+    # Configuração de CORS baseada no ambiente (adicionado por último para
+    # ser o middleware mais externo)
+    if settings.is_dev:
+        # Configuração permissiva para desenvolvimento
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=settings.cors_origins,
+            allow_credentials=False,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+    else:
+        # Configuração para produção
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=settings.cors_origins,
+            allow_credentials=True,
+            allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            allow_headers=["*"],
+        )
+
+    # 2. Inclui os roteadores na aplicação principal
+    app.include_router(user_controller.router)
+    app.include_router(role_controller.router)
+    app.include_router(auth_controller.router)
+    app.include_router(event_controller.router)
+    app.include_router(observability_controller.router)
+    return app
+
+
+app = create_app()
 
 # 4. Código para rodar o servidor
 if __name__ == '__main__':
     # Este bloco só executa quando rodamos o script diretamente (python main.py)
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
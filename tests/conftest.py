@@ -0,0 +1,22 @@
+"""
+Fixtures compartilhadas pelos testes.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import create_app  # importa main primeiro: ele coloca app/ no sys.path
+from config import Settings
+
+
+@pytest.fixture
+def client():
+    """
+    Cliente de uma aplicação nova e sem rate limiting.
+
+    O rate limiting fica ligado na aplicação padrão (`main.app`) e as cotas
+    de escrita são compartilhadas entre os módulos de teste; testes que fazem
+    muitas requisições usam este cliente. Para rodar o lifespan (e usar um só
+    event loop), use `with client:` dentro do teste.
+    """
+    return TestClient(create_app(Settings(rate_limit_enabled=False)))
@@ -79,3 +79,95 @@ def test_acesso_com_token_invalido(client):
     headers = {"Authorization": "Bearer token_invalido"}
     response = client.get("/users/", headers=headers)
     assert response.status_code == 401 or response.status_code == 403
+
+
+def test_login_rate_limit():
+    """
+    Testa o rate limiting do endpoint de login.
+
+    Usa uma aplicação nova (buckets zerados) para não afetar os demais testes:
+    depois de esgotar o bucket do IP, o login deve responder 429 com Retry-After.
+    """
+    from main import create_app
+    from config import Settings
+
+    limited_client = TestClient(create_app(Settings()))
+    statuses = [
+        limited_client.post("/auth/login", data={
+            "username": "usuario_invalido@ifg.edu.br",
+            "password": "senhaerrada"
+        }).status_code
+        for _ in range(11)
+    ]
+    assert statuses[:10] == [401] * 10
+    assert statuses[10] == 429
+
+
+def test_login_rate_limit_atras_de_proxy():
+    """
+    Testa o rate limiting do login atrás de um proxy confiável.
+
+    Com TRUSTED_PROXIES, o bucket é do IP do X-Forwarded-For: esgotar o de
+    um cliente não bloqueia os demais que chegam pelo mesmo proxy.
+    """
+    from main import create_app
+    from config import Settings
+
+    limited_client = TestClient(create_app(Settings(trusted_proxies=["*"])))
+
+    def login(forwarded_for):
+        return limited_client.post("/auth/login", data={
+            "username": "usuario_invalido@ifg.edu.br",
+            "password": "senhaerrada"
+        }, headers={"X-Forwarded-For": forwarded_for}).status_code
+
+    statuses = [login("203.0.113.10") for _ in range(11)]
+    assert statuses[10] == 429
+    assert login("203.0.113.20") == 401
+    # Endereços à esquerda do último proxy confiável não são levados em conta
+    assert login("203.0.113.20, 203.0.113.10") == 429
+
+
+def test_rate_limit_no_banco_apaga_buckets_parados():
+    """
+    Testa a limpeza da tabela rate_limit_buckets: buckets parados há mais que
+    o tempo de recarga completo (burst / rate) são apagados; os recentes ficam.
+    """
+    from sqlalchemy import text
+    from database import SessionLocal, get_engine
+    from rate_limit.rate_limit_store import DatabaseBucketStore
+
+    get_engine()
+    with SessionLocal() as db:
+        db.execute(text("""
+            INSERT INTO rate_limit_buckets (key, tokens, allowed, updated_at) VALUES
+                ('test:parado', 0, false, now() - interval '1 hour'),
+                ('test:recente', 0, false, now())
+            ON CONFLICT (key) DO UPDATE SET updated_at = excluded.updated_at
+        """))
+        db.commit()
+
+    store = DatabaseBucketStore(prune_every=1)
+    assert store.consume("test:novo", rate=1, burst=10) == (True, 0.0)
+
+    with SessionLocal() as db:
+        keys = set(db.scalars(text("SELECT key FROM rate_limit_buckets WHERE key LIKE 'test:%'")))
+        db.execute(text("DELETE FROM rate_limit_buckets WHERE key LIKE 'test:%'"))
+        db.commit()
+    assert keys == {"test:recente", "test:novo"}
+
+
+def test_rate_limit_no_banco_libera_com_banco_indisponivel(monkeypatch):
+    """
+    Testa o fail open do rate limiting no banco: com o banco indisponível a
+    requisição é liberada (e o erro registrado no log) em vez de virar 500.
+    """
+    from database import DatabaseUnavailable
+    from rate_limit import rate_limit_store
+
+    def indisponivel():
+        raise DatabaseUnavailable("banco fora")
+
+    monkeypatch.setattr(rate_limit_store, "SessionLocal", indisponivel)
+    store = rate_limit_store.DatabaseBucketStore()
+    assert store.consume("test:qualquer", rate=1, burst=1) == (True, 0.0)
@@ -0,0 +1,123 @@
+"""
+Testes do roteamento entre primário e réplicas de leitura (RoutingSession)
+
+A "réplica" é outro banco no mesmo servidor, com as mesmas tabelas e sem os
+dados: uma leitura que vai para ela vê o nome do outro banco e não encontra
+o que acabou de ser escrito no primário, como uma réplica atrasada.
+"""
+
+import uuid
+
+import pytest
+from fastapi import Response
+from sqlalchemy import create_engine, func, select, text, update
+from starlette.requests import Request
+
+import main  # noqa: F401 (coloca app/ no sys.path)
+import database
+from idempotency.idempotency_store import DatabaseIdempotencyStore, StoredResponse
+from roles.role_model import Role
+
+REPLICA_DATABASE = "programacaoiii_replica_test"
+
+
+def _replica_pool(engine):
+    return database.ReplicaPool([engine], max_lag_seconds=5, check_interval=60)
+
+
+@pytest.fixture(scope="module")
+def replica_engine():
+    primary = database.get_engine()
+    admin = create_engine(primary.url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as connection:
+        exists = connection.scalar(text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                                   {"name": REPLICA_DATABASE})
+        if not exists:
+            connection.execute(text(f'CREATE DATABASE "{REPLICA_DATABASE}"'))
+    admin.dispose()
+    engine = create_engine(primary.url.set(database=REPLICA_DATABASE))
+    database.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def replica(monkeypatch, replica_engine):
+    monkeypatch.setattr(database, "_replicas", _replica_pool(replica_engine))
+    return replica_engine
+
+
+def _request(cookies: str = "") -> Request:
+    headers = [(b"cookie", cookies.encode())] if cookies else []
+    return Request({"type": "http", "headers": headers})
+
+
+def _current_database(db) -> str:
+    return db.scalar(select(func.current_database()))
+
+
+def test_leitura_vai_para_replica_e_escrita_para_primario(replica):
+    primary_name = database.get_engine().url.database
+    with database.SessionLocal() as db:
+        assert _current_database(db) == REPLICA_DATABASE
+        db.execute(update(Role).where(Role.id == -1).values(name="inexistente"))
+        # Depois de uma escrita a sessão inteira fica no primário
+        assert _current_database(db) == primary_name
+        db.rollback()
+
+
+def test_cookie_de_escrita_fixa_leituras_no_primario(replica):
+    primary_name = database.get_engine().url.database
+
+    response = Response()
+    sessions = database.get_db(_request(), response)
+    db = next(sessions)
+    assert _current_database(db) == REPLICA_DATABASE
+    db.execute(update(Role).where(Role.id == -1).values(name="inexistente"))
+    db.rollback()
+    sessions.close()
+    assert database.READ_YOUR_WRITES_COOKIE in response.headers["set-cookie"]
+
+    # A requisição seguinte do mesmo cliente traz o cookie e lê do primário
+    sessions = database.get_db(_request(f"{database.READ_YOUR_WRITES_COOKIE}=1"), Response())
+    db = next(sessions)
+    assert _current_database(db) == primary_name
+    sessions.close()
+
+
+
+def test_janela_do_cookie_vem_do_init_engine(replica, monkeypatch):
+    """A janela de read-your-writes é a das settings da engine, não as globais."""
+    def sem_settings_globais():
+        raise AssertionError("get_db não deve ler get_settings()")
+
+    monkeypatch.setattr(database, "get_settings", sem_settings_globais)
+    monkeypatch.setattr(database, "_sticky_seconds", 17)
+    response = Response()
+    sessions = database.get_db(_request(), response)
+    db = next(sessions)
+    db.execute(update(Role).where(Role.id == -1).values(name="inexistente"))
+    db.rollback()
+    sessions.close()
+    assert "Max-Age=17" in response.headers["set-cookie"]
+
+def test_replica_indisponivel_leituras_vao_para_primario(monkeypatch):
+    primary = database.get_engine()
+    offline = create_engine(primary.url.set(port=1), connect_args={"connect_timeout": 1})
+    monkeypatch.setattr(database, "_replicas", _replica_pool(offline))
+    with database.SessionLocal() as db:
+        assert _current_database(db) == primary.url.database
+    offline.dispose()
+
+
+def test_idempotencia_le_do_primario(replica):
+    """A resposta gravada é encontrada mesmo com a réplica sem a reserva."""
+    store = DatabaseIdempotencyStore(ttl_seconds=60, max_entries=100)
+    key = f"routing-{uuid.uuid4()}"
+
+    assert store.begin(key, "fp") is None
+    store.complete(key, StoredResponse("fp", 201, "application/json", b"{}"))
+
+    stored = store.begin(key, "fp")
+    assert stored is not None and stored.status_code == 201
+    store.discard(key)
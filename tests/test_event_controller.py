@@ -0,0 +1,102 @@
+"""
+Testes do feed de mudanças (SSE)
+
+Cobrem a retomada com Last-Event-ID (replay do buffer e 410 quando os eventos
+já saíram dele) e a proteção contra clientes lentos (fila limitada por conexão).
+"""
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from events import event_controller
+from events.event_broker import EventBroker
+from events.event_model import ChangeEvent
+
+LOGIN_EMAIL = "murilo.assis@ifg.edu.br"
+LOGIN_PASSWORD = "12345678"
+
+
+@pytest.fixture(scope="module")
+def client_and_token():
+    client = TestClient(app)
+    login_response = client.post("/auth/login", data={
+        "username": LOGIN_EMAIL,
+        "password": LOGIN_PASSWORD
+    })
+    assert login_response.status_code == 200, f"Login falhou: {login_response.text}"
+    return client, login_response.json()["access_token"]
+
+
+def _change(version: int) -> ChangeEvent:
+    return ChangeEvent(entity="user", id=version, op="update", version=version)
+
+
+class _DisconnectedRequest:
+    """Requisição cujo cliente já desconectou: o stream termina depois do replay."""
+
+    async def is_disconnected(self) -> bool:
+        return True
+
+
+def test_events_replay_por_last_event_id(monkeypatch):
+    """
+    Testa a retomada do stream.
+
+    Quem reconecta recebe, em ordem, só os eventos posteriores ao
+    Last-Event-ID; quem pede uma versão que já saiu do buffer recebe reset.
+    """
+    broker = EventBroker(replay_size=3)
+    monkeypatch.setattr(event_controller, "broker", broker)
+    for version in range(1, 6):
+        broker.publish(_change(version))
+    broker.publish(_change(5))  # duplicado (entrega local e NOTIFY): ignorado
+
+    assert [event.version for event in broker.replay_since(3)] == [4, 5]
+    assert [event.version for event in broker.replay_since(2)] == [3, 4, 5]
+    assert broker.replay_since(1) is None
+
+    async def read_stream(last_event_id):
+        return [chunk async for chunk in event_controller._event_stream(_DisconnectedRequest(), last_event_id)]
+
+    chunks = asyncio.run(read_stream(3))
+    assert [chunk.split("\n")[0] for chunk in chunks] == ["id: 4", "id: 5"]
+    assert asyncio.run(read_stream(1))[0].startswith("event: reset")
+
+
+def test_events_last_event_id_fora_do_buffer(client_and_token, monkeypatch):
+    """Last-Event-ID anterior ao início do buffer: 410, o cliente deve ressincronizar."""
+    client, token = client_and_token
+    broker = EventBroker()
+    broker.reset_floor(1000)
+    monkeypatch.setattr(event_controller, "broker", broker)
+
+    response = client.get("/events", headers={"Authorization": f"Bearer {token}", "Last-Event-ID": "999"})
+    assert response.status_code == 410
+
+
+def test_events_cliente_lento():
+    """
+    Testa a contrapressão por conexão.
+
+    Quando a fila de um cliente enche, os eventos acumulados são descartados e
+    a assinatura termina (sentinela None); os demais clientes não são afetados.
+    """
+    async def scenario():
+        broker = EventBroker(max_queue=2)
+        slow, fast = broker.subscribe(), broker.subscribe()
+        for version in range(1, 4):
+            broker.publish(_change(version))
+            await asyncio.sleep(0)  # entrega (call_soon_threadsafe)
+            if version < 3:
+                assert (await fast.queue.get()).version == version
+        await asyncio.sleep(0)
+        return slow, fast
+
+    slow, fast = asyncio.run(scenario())
+    assert slow.overflowed
+    assert slow.queue.qsize() == 1 and slow.queue.get_nowait() is None
+    assert not fast.overflowed
+    assert fast.queue.get_nowait().version == 3
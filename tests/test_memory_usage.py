@@ -0,0 +1,141 @@
+"""
+Testes de regressão de memória
+
+Medem, com o tracemalloc, o pico de memória alocada pelos caminhos suspeitos
+de fazer o RSS dos workers crescer: a conversão de uma imagem grande e a
+listagem de muitos usuários. Os limites têm folga sobre o valor medido; se um
+teste falhar, algo passou a fazer cópias a mais ou a materializar dados demais.
+
+Obs.: o tracemalloc só enxerga alocações do Python. Os buffers de pixels do
+PIL (alocados em C) não entram nesses números.
+"""
+
+import base64
+import io
+import os
+import tracemalloc
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+
+from main import create_app
+from config import Settings
+import database
+from observability.memory_stats import memory_stats
+from roles import role_model
+from users import user_model, user_repository
+from utils.image_processor import process_image_base64
+
+LOGIN_EMAIL = "murilo.assis@ifg.edu.br"
+LOGIN_PASSWORD = "12345678"
+
+MB = 1024 * 1024
+
+
+def _peak_during(func):
+    """Executa `func` e retorna (resultado, pico de memória alocada em bytes)."""
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak - start
+
+
+def test_pico_memoria_imagem_10mb():
+    """
+    Converter uma imagem AVIF de 10 MB para JPEG não pode ultrapassar 4 cópias
+    do Data URL (hoje: o base64 extraído, os bytes decodificados, o JPEG e o
+    base64 de saída).
+    """
+    from PIL import Image, features
+    if not features.check("avif"):
+        pytest.skip("Pillow sem suporte a AVIF")
+    side = 2450  # ~10 MB de pixels aleatórios, que o AVIF não consegue comprimir
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="AVIF", quality=100, speed=10)
+    assert buffer.tell() >= 10 * 1000 * 1000
+    data_url = "data:image/avif;base64," + base64.b64encode(buffer.getvalue()).decode()
+    del image, buffer
+
+    processed, peak = _peak_during(lambda: process_image_base64(data_url))
+
+    assert processed.startswith("data:image/jpeg;base64,")
+    assert peak < 4 * len(data_url), f"Pico de {peak / MB:.1f} MB para um Data URL de {len(data_url) / MB:.1f} MB"
+
+
+def test_pico_memoria_listagem_10k_usuarios():
+    """
+    Listar e serializar 10 mil usuários (como GET /users/) deve ficar abaixo
+    de 5 KB por usuário. Os usuários são inseridos numa transação desfeita no fim.
+    """
+    total = 10_000
+    database.get_engine()
+    with database.SessionLocal() as db:
+        try:
+            role_id = db.scalar(select(role_model.Role.id).limit(1))
+            db.execute(insert(user_model.User), [
+                {"email": f"test_memory_user_{i}@example.com", "hashed_password": "x" * 60,
+                 "full_name": f"Usuário {i}", "role_id": role_id}
+                for i in range(total)
+            ])
+            db.expunge_all()
+            adapter = TypeAdapter(List[user_model.UserPublic])
+
+            def list_users():
+                users = user_repository.get_users(db)
+                return len(users), adapter.dump_json(adapter.validate_python(users, from_attributes=True))
+
+            (count, _), peak = _peak_during(list_users)
+        finally:
+            db.rollback()
+
+    assert count >= total
+    assert peak < total * 5 * 1024, f"Pico de {peak / MB:.1f} MB para {count} usuários"
+
+
+@pytest.fixture
+def memory_client():
+    memory_stats.reset()
+    memory_stats.start()
+    client = TestClient(create_app(Settings(memory_tracking_enabled=True, rate_limit_enabled=False)))
+    login_response = client.post("/auth/login", data={"username": LOGIN_EMAIL, "password": LOGIN_PASSWORD})
+    assert login_response.status_code == 200, f"Login falhou: {login_response.text}"
+    try:
+        yield client, {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+    finally:
+        memory_stats.stop()
+        memory_stats.reset()
+
+
+def test_admin_memory(memory_client):
+    """
+    Com MEMORY_TRACKING_ENABLED, as rotas marcadas registram o pico de
+    memória durante a requisição e o administrador consegue o diff entre
+    dois snapshots.
+    """
+    client, headers = memory_client
+
+    assert client.post("/admin/memory/snapshot", headers=headers).status_code == 204
+    assert client.get("/users/", headers=headers).status_code == 200
+    client.get("/roles/", headers=headers)  # rota não marcada
+
+    memory = client.get("/admin/memory", headers=headers)
+    assert memory.status_code == 200
+    assert memory.json()["gauges"]["tracing"] is True
+    assert memory.json()["gauges"]["max_rss_bytes"] > 0
+    tags = {row["tag"]: row for row in memory.json()["tags"]}
+    assert set(tags) == {"GET /users/"}
+    assert tags["GET /users/"]["count"] == 1
+    assert tags["GET /users/"]["max_peak_bytes"] > 0
+
+    diff = client.get("/admin/memory/diff", params={"limit": 5}, headers=headers)
+    assert diff.status_code == 200
+    assert len(diff.json()) <= 5
@@ -0,0 +1,200 @@
+"""
+Testes de observabilidade
+
+Cobrem o profiling sob demanda e por amostragem (ProfilingMiddleware) e o
+agrupamento de consultas SQL por fingerprint (/admin/queries).
+"""
+
+import asyncio
+import json
+import random
+import string
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from main import app, create_app
+from config import Settings
+from observability.profiling_middleware import ProfilingMiddleware
+from observability.query_stats import fingerprint, query_stats
+
+LOGIN_EMAIL = "murilo.assis@ifg.edu.br"
+LOGIN_PASSWORD = "12345678"
+
+
+@pytest.fixture(scope="module")
+def client_and_token():
+    client = TestClient(app)
+    login_response = client.post("/auth/login", data={
+        "username": LOGIN_EMAIL,
+        "password": LOGIN_PASSWORD
+    })
+    assert login_response.status_code == 200, f"Login falhou: {login_response.text}"
+    return client, login_response.json()["access_token"]
+
+
+def test_profiling_exige_admin(client, client_and_token):
+    """
+    Testa que o gatilho de profiling é restrito a administradores.
+
+    Um usuário comum que envia X-Profile recebe 403; sem o gatilho, a mesma
+    requisição funciona normalmente.
+    """
+    _, token = client_and_token
+    admin_headers = {"Authorization": f"Bearer {token}"}
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    role_id = client.post("/roles/", json={"name": f"test_profiling_{random_suffix}"}, headers=admin_headers).json()["id"]
+    email = f"test_profiling_{random_suffix}@example.com"
+    user_id = client.post("/users/", json={"email": email, "password": "password123", "role_id": role_id},
+                          headers=admin_headers).json()["id"]
+    try:
+        login = client.post("/auth/login", data={"username": email, "password": "password123"})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        assert client.get(f"/users/{user_id}", headers={**headers, "X-Profile": "1"}).status_code == 403
+        assert client.get(f"/users/{user_id}", params={"__profile": "1"}, headers=headers).status_code == 403
+        assert client.get(f"/users/{user_id}", headers={"X-Profile": "1"}).status_code == 403
+        assert client.get(f"/users/{user_id}", headers=headers).status_code == 200
+    finally:
+        client.delete(f"/users/{user_id}", headers=admin_headers)
+        client.delete(f"/roles/{role_id}", headers=admin_headers)
+
+
+def test_profiling_sob_demanda(client_and_token, tmp_path):
+    """
+    Testa o gatilho de profiling de um administrador.
+
+    Com `X-Profile: 1` a resposta é a normal, com o caminho do perfil em
+    X-Profile-File; com `X-Profile: speedscope` o perfil é a própria resposta.
+    """
+    _, token = client_and_token
+    client = TestClient(create_app(Settings(rate_limit_enabled=False, profile_dir=str(tmp_path))))
+    headers = {"Authorization": f"Bearer {token}"}
+
+    saved = client.get("/roles/", headers={**headers, "X-Profile": "1"})
+    assert saved.status_code == 200
+    assert saved.json() == client.get("/roles/", headers=headers).json()
+    with open(saved.headers["X-Profile-File"]) as f:
+        assert json.load(f)["name"] == "GET /roles/"
+
+    inline = client.get("/roles/", headers={**headers, "X-Profile": "speedscope"})
+    assert inline.status_code == 200
+    profile = inline.json()
+    assert profile["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+    assert profile["name"] == "GET /roles/"
+    assert isinstance(profile["shared"]["frames"], list)
+    sql = [p for p in profile["profiles"] if p["type"] == "evented" and p["name"] == "SQL"]
+    assert sql and sql[0]["events"], "As consultas da requisição não entraram no perfil"
+    assert all(p["unit"] == "milliseconds" for p in profile["profiles"])
+
+
+def test_profiling_por_amostragem(client_and_token, tmp_path):
+    """Com PROFILE_SAMPLE_RATE=1, toda requisição é perfilada sem precisar de gatilho."""
+    _, token = client_and_token
+    client = TestClient(create_app(Settings(rate_limit_enabled=False, profile_dir=str(tmp_path),
+                                            profile_sample_rate=1.0)))
+
+    response = client.get("/roles/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert "X-Profile-File" in response.headers
+    assert len(list(tmp_path.glob("*.speedscope.json"))) == 1
+
+    client = TestClient(create_app(Settings(rate_limit_enabled=False, profile_dir=str(tmp_path))))
+    assert "X-Profile-File" not in client.get("/roles/", headers={"Authorization": f"Bearer {token}"}).headers
+
+
+def test_profiling_nao_bufferiza_streaming(tmp_path):
+    """
+    Testa que respostas em streaming (SSE) passam sem buffer.
+
+    O profiler tem que parar antes de o corpo ser gerado; antes, o middleware
+    juntava o stream inteiro (que no /events nunca termina) com o profiler ligado.
+    """
+    profiler_running = []
+
+    async def stream():
+        for i in range(3):
+            await asyncio.sleep(0.05)  # o middleware pode estar parando o profiler agora
+            profiler_running.append(any(t.name == "sampling-profiler" for t in threading.enumerate()))
+            yield f"data: {i}\n\n"
+
+    stream_app = FastAPI()
+    stream_app.add_middleware(ProfilingMiddleware, profile_dir=str(tmp_path), sample_rate=1.0)
+
+    @stream_app.get("/stream")
+    def get_stream():
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    response = TestClient(stream_app).get("/stream")
+    assert response.status_code == 200
+    assert response.text == "data: 0\n\ndata: 1\n\ndata: 2\n\n"
+    assert "X-Profile-File" in response.headers
+    assert profiler_running == [False, False, False]
+
+
+@pytest.mark.parametrize("statements", [
+    # Literais de texto (inclusive com aspas escapadas)
+    ["SELECT * FROM users WHERE email = 'a@ifg.edu.br'",
+     "SELECT * FROM users WHERE email = 'o''brien@ifg.edu.br'",
+     "SELECT * FROM users WHERE email = %(email_1)s"],
+    # Números e parâmetros (estilos do psycopg2, do asyncpg e nomeados)
+    ["SELECT * FROM users WHERE id = 1 LIMIT 10",
+     "SELECT * FROM users WHERE id = 42.5 LIMIT 1",
+     "SELECT * FROM users WHERE id = %(id_1)s LIMIT %(param_1)s",
+     "SELECT * FROM users WHERE id = $1 LIMIT $2",
+     "SELECT * FROM users WHERE id = :id LIMIT :limit"],
+    # Listas IN de qualquer tamanho, com comentários e quebras de linha
+    ["SELECT * FROM users WHERE id IN (1, 2, 3)",
+     "SELECT * FROM users WHERE id IN (7)",
+     "SELECT * FROM users\n  WHERE id IN (%(id_1_1)s, %(id_1_2)s) -- lote",
+     "/* admin */ SELECT * FROM users WHERE id IN ('a', 'b')"],
+    # INSERT com várias linhas em VALUES
+    ["INSERT INTO tombstones (entity, entity_id) VALUES ('user', 1)",
+     "INSERT INTO tombstones (entity, entity_id) VALUES (%(e_m0)s, %(i_m0)s), (%(e_m1)s, %(i_m1)s)"],
+])
+def test_fingerprint_normaliza_literais(statements):
+    """Consultas que só diferem em literais, parâmetros ou tamanho de listas têm o mesmo fingerprint."""
+    assert len({fingerprint(statement) for statement in statements}) == 1
+
+
+def test_fingerprint_distingue_consultas():
+    """Colunas e tabelas diferentes continuam em fingerprints separados."""
+    assert fingerprint("SELECT * FROM users WHERE id = 1") == "SELECT * FROM users WHERE id = ?"
+    assert fingerprint("SELECT * FROM users WHERE id IN (1, 2)") == "SELECT * FROM users WHERE id IN (...)"
+    assert fingerprint("SELECT * FROM users WHERE id = 1") != fingerprint("SELECT * FROM roles WHERE id = 1")
+    assert fingerprint("SELECT * FROM users WHERE id = 1") != fingerprint("SELECT * FROM users WHERE role_id = 1")
+
+
+def test_admin_queries_agrega_por_fingerprint(client, client_and_token):
+    """
+    Testa o endpoint de estatísticas de SQL.
+
+    Execuções com literais diferentes somam no mesmo fingerprint, e as
+    consultas das requisições aparecem com a contagem de execuções.
+    """
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.delete("/admin/queries", headers=headers).status_code == 204
+
+    for user_id, duration_ms in ((1, 5.0), (2, 15.0), (3, 10.0)):
+        query_stats.record(f"SELECT * FROM test_fingerprint WHERE id = {user_id}", duration_ms, rows=1)
+    for _ in range(3):
+        assert client.get("/roles/", headers=headers).status_code == 200
+
+    response = client.get("/admin/queries", params={"order_by": "count", "limit": 1000}, headers=headers)
+    assert response.status_code == 200
+    rows = {row["fingerprint"]: row for row in response.json()}
+    manual = rows["SELECT * FROM test_fingerprint WHERE id = ?"]
+    assert (manual["count"], manual["total_ms"], manual["max_ms"], manual["rows"]) == (3, 30.0, 15.0, 3)
+    assert manual["p50_ms"] == 10.0
+    roles = [row for fp, row in rows.items() if fp.startswith("SELECT roles.id") and "FROM roles" in fp
+             and "WHERE" not in fp]
+    assert len(roles) == 1 and roles[0]["count"] == 3
+    assert [row["count"] for row in response.json()] == sorted((row["count"] for row in response.json()), reverse=True)
+
+    assert client.delete("/admin/queries", headers=headers).status_code == 204
+    assert "SELECT * FROM test_fingerprint WHERE id = ?" not in {
+        row["fingerprint"] for row in client.get("/admin/queries", headers=headers).json()}
@@ -101,3 +101,255 @@ def test_role_nome_curto(client_and_token):
     role_data = {"name": "a"}
     resp = client.post("/roles/", json=role_data, headers=headers)
     assert resp.status_code == 422 or resp.status_code == 400, f"Role criada com nome curto: {resp.text}"
+
+
+def test_role_idempotency_key(client_and_token):
+    """
+    Testa a repetição de um POST com o mesmo Idempotency-Key.
+
+    A segunda requisição deve devolver a resposta registrada (mesmo ID)
+    em vez de falhar com nome duplicado. Reutilizar a chave com outro
+    corpo deve ser rejeitado.
+    """
+    client, token = client_and_token
+    import random, string
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    headers = {"Authorization": f"Bearer {token}", "Idempotency-Key": f"role-{random_suffix}"}
+    role_data = {"name": f"test_role_idempotent_{random_suffix}"}
+
+    resp1 = client.post("/roles/", json=role_data, headers=headers)
+    assert resp1.status_code == 201, f"Falha ao criar role: {resp1.text}"
+    resp2 = client.post("/roles/", json=role_data, headers=headers)
+    assert resp2.status_code == 201, f"Repetição não reaproveitou a resposta: {resp2.text}"
+    assert resp2.json()["id"] == resp1.json()["id"]
+    assert resp2.headers.get("Idempotent-Replayed") == "true"
+
+    resp3 = client.post("/roles/", json={"name": f"outro_nome_{random_suffix}"}, headers=headers)
+    assert resp3.status_code == 422
+
+    client.delete(f"/roles/{resp1.json()['id']}", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_idempotency_reserva_abandonada():
+    """
+    Testa a retomada de uma Idempotency-Key cujo processo caiu no meio.
+
+    Dentro do lease a chave continua em andamento (409 para quem repete);
+    depois dele, a próxima tentativa assume a chave.
+    """
+    import random, string
+    from idempotency.idempotency_store import DatabaseIdempotencyStore, MemoryIdempotencyStore
+    for store in (MemoryIdempotencyStore(ttl_seconds=3600, max_entries=100, lease_seconds=60),
+                  DatabaseIdempotencyStore(ttl_seconds=3600, max_entries=100, lease_seconds=60)):
+        key = "test-lease-" + ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+        assert store.begin(key, "fp") is None
+        assert store.begin(key, "fp").in_progress
+        store.lease_seconds = 0
+        try:
+            assert store.begin(key, "fp") is None, f"{type(store).__name__} não assumiu a reserva abandonada"
+        finally:
+            store.discard(key)
+
+
+
+def test_idempotency_preserva_cabecalhos_repetidos():
+    """
+    Testa que a primeira execução com Idempotency-Key mantém todos os
+    Set-Cookie da rota, e que um corpo diferente com a mesma chave dá 422.
+    """
+    from fastapi import FastAPI, Response
+    from idempotency.idempotency_middleware import IdempotencyMiddleware
+    from idempotency.idempotency_store import MemoryIdempotencyStore
+
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, store=MemoryIdempotencyStore(ttl_seconds=60, max_entries=10))
+
+    @app.post("/users/cookies")
+    def cookies(response: Response):
+        response.set_cookie("a", "1")
+        response.set_cookie("b", "2")
+        return {"ok": True}
+
+    test_client = TestClient(app)
+    response = test_client.post("/users/cookies", json={}, headers={"Idempotency-Key": "cookies"})
+    assert response.status_code == 200
+    assert response.headers.get_list("set-cookie") == [
+        "a=1; Path=/; SameSite=lax", "b=2; Path=/; SameSite=lax"]
+
+    response = test_client.post("/users/cookies", json={"x": 1}, headers={"Idempotency-Key": "cookies"})
+    assert response.status_code == 422
+
+def test_role_changes_com_transacao_em_andamento(client, client_and_token):
+    """
+    Testa a marca d'água da sincronização incremental com escritas concorrentes.
+
+    Uma transação que alterou um perfil e ainda não fez commit não segura as
+    outras escritas; a versão dela só é atribuída no commit, então a marca
+    d'água lida nesse meio tempo não pula a alteração, que aparece depois
+    com versão maior que a da escrita que terminou antes.
+    """
+    import random, string, threading
+    from sqlalchemy import update
+    import database
+    from events.event_service import notify_change
+    from roles import role_model
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+
+    role_id = client.post("/roles/", json={"name": f"test_role_sync_{random_suffix}"}, headers=headers).json()["id"]
+    since = 0
+    while True:
+        page = client.get("/roles/changes", params={"since": since, "limit": 1000}, headers=headers).json()
+        since = page["version"]
+        if not page["has_more"]:
+            break
+
+    created = {}
+    with database.SessionLocal() as db:
+        version = db.scalar(update(role_model.Role).where(role_model.Role.id == role_id)
+                            .values(name=f"test_role_sync_alterado_{random_suffix}")
+                            .returning(role_model.Role.version))
+        change = notify_change(db, "role", role_id, "update", version)
+        writer = threading.Thread(target=lambda: created.update(client.post(
+            "/roles/", json={"name": f"test_role_sync_novo_{random_suffix}"}, headers=headers).json()))
+        writer.start()
+        writer.join(timeout=10)
+        assert not writer.is_alive(), "A segunda escrita esperou o commit de uma transação alheia"
+        during = client.get("/roles/changes", params={"since": since}, headers=headers).json()
+        assert [item["id"] for item in during["items"]] == [created["id"]]
+        db.commit()
+    assert change.version > during["version"]
+
+    after = client.get("/roles/changes", params={"since": during["version"]}, headers=headers).json()
+    assert [(item["id"], item["version"]) for item in after["items"]] == [(role_id, change.version)]
+
+    for deleted_id in (role_id, created["id"]):
+        client.delete(f"/roles/{deleted_id}", headers=headers)
+
+
+def test_role_stats_e_exclusao_com_membros(client, client_and_token):
+    """
+    Testa os contadores de membros (/roles/stats).
+
+    Criar e excluir um usuário move o contador do perfil; um perfil com
+    membros não pode ser excluído (409).
+    """
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    import random, string
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+
+    def member_count(role_id):
+        stats = client.get("/roles/stats", headers=headers)
+        assert stats.status_code == 200, f"Falha nas estatísticas: {stats.text}"
+        counts = {role["id"]: role["member_count"] for role in stats.json()["roles"]}
+        assert stats.json()["total_users"] == sum(counts.values())
+        return counts[role_id]
+
+    role_id = client.post("/roles/", json={"name": f"test_role_stats_{random_suffix}"}, headers=headers).json()["id"]
+    assert member_count(role_id) == 0
+
+    user_resp = client.post("/users/", json={
+        "email": f"test_role_stats_{random_suffix}@example.com",
+        "password": "password123",
+        "role_id": role_id
+    }, headers=headers)
+    assert user_resp.status_code == 201, f"Falha ao criar usuário: {user_resp.text}"
+    assert member_count(role_id) == 1
+
+    delete_resp = client.delete(f"/roles/{role_id}", headers=headers)
+    assert delete_resp.status_code == 409, f"Perfil com membros foi excluído: {delete_resp.text}"
+
+    client.delete(f"/users/{user_resp.json()['id']}", headers=headers)
+    assert member_count(role_id) == 0
+    assert client.delete(f"/roles/{role_id}", headers=headers).status_code == 200
+
+
+def test_reconciliacao_em_um_processo_por_vez():
+    """
+    Testa que a reconciliação dos contadores roda em um só processo por vez:
+    com o advisory lock em poder de outra sessão, a rodada é pulada na hora
+    (sem esperar o LOCK TABLE), e volta a rodar quando ele é liberado.
+    """
+    from sqlalchemy import text
+    from database import SessionLocal, get_engine
+    from roles import role_reconciler, role_repository
+
+    get_engine()
+    with SessionLocal() as holder:
+        holder.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": role_repository.RECONCILE_LOCK_KEY})
+        with SessionLocal() as db:
+            assert role_repository.reconcile_member_counts(db) is None
+        assert role_reconciler.reconcile_member_counts() == {}
+        holder.rollback()
+
+    with SessionLocal() as db:
+        assert role_repository.reconcile_member_counts(db) is not None
+
+
+def test_roles_com_banco_indisponivel(client, client_and_token):
+    """
+    Testa o modo degradado (circuit breaker aberto).
+
+    A listagem de perfis é servida da última resposta boa, com Warning/Age,
+    e o usuário do token vem do cache de principals; escritas e leituras sem
+    cache recebem 503. Depois do reset_timeout, o probe fecha o circuito.
+    """
+    import database
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    fresh = client.get("/roles/", headers=headers)
+    assert fresh.status_code == 200
+    assert "Warning" not in fresh.headers
+
+    breaker = database.get_breaker()
+    reset_timeout = breaker.reset_timeout
+    breaker.reset_timeout = 60
+    breaker.trip()
+    try:
+        stale = client.get("/roles/", headers=headers)
+        assert stale.status_code == 200
+        assert stale.json() == fresh.json()
+        assert stale.headers["Warning"] == '110 - "Response is Stale"'
+        assert int(stale.headers["Age"]) >= 0
+
+        write = client.post("/roles/", json={"name": "perfil_com_banco_fora"}, headers=headers)
+        assert write.status_code == 503
+        assert "Retry-After" in write.headers
+        assert client.get("/roles/stats", headers=headers).status_code == 503
+
+        # Half-open: passado o reset_timeout, o probe encontra o banco e fecha o circuito
+        breaker.reset_timeout = 0
+        recovered = client.get("/roles/", headers=headers)
+        assert recovered.status_code == 200
+        assert "Warning" not in recovered.headers
+        assert breaker.state == "closed"
+    finally:
+        breaker.reset_timeout = reset_timeout
+        breaker.reset()
+
+
+def test_cache_degradado_limitado_em_bytes():
+    """
+    Testa o limite de bytes do cache do modo degradado: as respostas mais
+    antigas saem quando o total passa de max_bytes, e uma resposta maior que
+    o limite inteiro não é guardada.
+    """
+    from resilience.stale_cache import StaleCache
+
+    cache = StaleCache(max_entries=100, max_bytes=10)
+    cache.put("a", "a", size=4)
+    cache.put("b", "b", size=4)
+    cache.put("c", "c", size=4)
+    assert cache.get("a") is None
+    assert cache.get("b")[0] == "b" and cache.get("c")[0] == "c"
+
+    cache.put("grande", "grande", size=11)
+    assert cache.get("grande") is None
+    assert cache.get("c")[0] == "c"
+
+    cache.discard("b")
+    cache.put("d", "d", size=6)
+    assert cache.get("c")[0] == "c" and cache.get("d")[0] == "d"
@@ -109,4 +109,521 @@ def test_user_crud_sequence(client_and_token):
     assert deleted_json["id"] == user_id
     assert deleted_json["email"] == test_email
     assert deleted_json["full_name"] == "Test Sequence User Updated"
-    assert "role" in deleted_json and deleted_json["role"]["id"] == role_id
\ No newline at end of file
+    assert "role" in deleted_json and deleted_json["role"]["id"] == role_id
+
+def test_user_email_duplicado(client_and_token):
+    """
+    Testa criação de usuário com e-mail já cadastrado.
+
+    A unicidade é garantida pela restrição UNIQUE do banco; a violação
+    deve ser convertida em erro 400, e não em erro interno (500).
+    """
+    client, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    import random, string
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    role_id = client.get("/roles/", headers=headers).json()[0]["id"]
+    user_data = {
+        "email": f"test_duplicate_user_{random_suffix}@example.com",
+        "password": "password123",
+        "role_id": role_id
+    }
+    resp1 = client.post("/users/", json=user_data, headers=headers)
+    assert resp1.status_code == 201, f"Falha ao criar usuário: {resp1.text}"
+    resp2 = client.post("/users/", json=user_data, headers=headers)
+    assert resp2.status_code == 400, f"Usuário duplicado criado: {resp2.text}"
+    # Limpa o usuário criado
+    client.delete(f"/users/{resp1.json()['id']}", headers=headers)
+
+
+def test_user_changes_sync(client_and_token):
+    """
+    Testa a sincronização incremental (/users/changes).
+
+    Parte da marca d'água atual, cria e exclui um usuário e verifica que cada
+    chamada devolve apenas a mudança feita depois da versão informada.
+    """
+    client, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    import random, string
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+
+    # Avança até o fim para obter a marca d'água atual
+    since = 0
+    while True:
+        page = client.get("/users/changes", params={"since": since, "limit": 1000}, headers=headers)
+        assert page.status_code == 200, f"Falha ao sincronizar: {page.text}"
+        since = page.json()["version"]
+        if not page.json()["has_more"]:
+            break
+
+    role_id = client.get("/roles/", headers=headers).json()[0]["id"]
+    user_resp = client.post("/users/", json={
+        "email": f"test_sync_user_{random_suffix}@example.com",
+        "password": "password123",
+        "role_id": role_id
+    }, headers=headers)
+    assert user_resp.status_code == 201
+    user_id = user_resp.json()["id"]
+
+    changes = client.get("/users/changes", params={"since": since}, headers=headers).json()
+    assert [item["id"] for item in changes["items"]] == [user_id]
+    assert changes["deleted"] == []
+    assert changes["version"] > since
+
+    client.delete(f"/users/{user_id}", headers=headers)
+    deleted = client.get("/users/changes", params={"since": changes["version"]}, headers=headers).json()
+    assert deleted["items"] == []
+    assert deleted["deleted"] == [user_id]
+    assert deleted["version"] > changes["version"]
+
+def test_user_image_processada_em_segundo_plano(client_and_token):
+    """
+    Testa a fila de imagens de perfil.
+
+    O cadastro responde com image_status "pending" e sem a imagem; depois que
+    o worker processa o job, a imagem aparece no usuário e o status vira "ready".
+    Uma imagem inválida termina com status "failed" e o erro registrado.
+    """
+    from images.image_worker import process_next_job
+    client, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    import base64, io, random, string
+    from PIL import Image
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buffer, format="PNG")
+    image = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+    role_id = client.get("/roles/", headers=headers).json()[0]["id"]
+    user_resp = client.post("/users/", json={
+        "email": f"test_image_user_{random_suffix}@example.com",
+        "password": "password123",
+        "role_id": role_id,
+        "profile_image_base64": image
+    }, headers=headers)
+    assert user_resp.status_code == 201, f"Falha ao criar usuário: {user_resp.text}"
+    assert user_resp.json()["image_status"] == "pending"
+    assert user_resp.json()["profile_image_base64"] is None
+    user_id = user_resp.json()["id"]
+
+    # Processa a fila até o job deste usuário terminar
+    while client.get(f"/users/{user_id}/image-status", headers=headers).json()["image_status"] == "pending":
+        assert process_next_job(), "A fila esvaziou sem processar a imagem"
+    user = client.get(f"/users/{user_id}", headers=headers).json()
+    assert user["image_status"] == "ready"
+    assert user["profile_image_base64"].startswith("data:image/png;base64,")
+
+    update_resp = client.put(f"/users/{user_id}", json={
+        "profile_image_base64": "imagem-invalida"
+    }, headers=headers)
+    assert update_resp.status_code == 200
+    assert update_resp.json()["image_status"] == "pending"
+    while client.get(f"/users/{user_id}/image-status", headers=headers).json()["image_status"] == "pending":
+        assert process_next_job(), "A fila esvaziou sem processar a imagem"
+    status_resp = client.get(f"/users/{user_id}/image-status", headers=headers).json()
+    assert status_resp["image_status"] == "failed"
+    assert status_resp["attempts"] == 1
+    assert status_resp["last_error"]
+
+    client.delete(f"/users/{user_id}", headers=headers)
+
+def _create_user_with_image(client, headers):
+    import base64, io, random, string
+    from PIL import Image
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "blue").save(buffer, format="PNG")
+    image = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+    role_id = client.get("/roles/", headers=headers).json()[0]["id"]
+    user_resp = client.post("/users/", json={
+        "email": f"test_image_race_{random_suffix}@example.com",
+        "password": "password123",
+        "role_id": role_id,
+        "profile_image_base64": image
+    }, headers=headers)
+    assert user_resp.status_code == 201, f"Falha ao criar usuário: {user_resp.text}"
+    return user_resp.json()["id"], image
+
+def _process_until_done(user_id):
+    """Roda o worker até o job mais recente do usuário sair da fila."""
+    from database import SessionLocal
+    from images import image_job_model, image_job_repository
+    from images.image_worker import process_next_job
+    while True:
+        with SessionLocal() as db:
+            job = image_job_repository.get_latest_job(db, user_id)
+        if job.status not in (image_job_model.QUEUED, image_job_model.RUNNING):
+            return job
+        assert process_next_job(), "A fila esvaziou sem processar a imagem"
+
+def test_user_image_removida_durante_processamento(client, client_and_token, monkeypatch):
+    """
+    Testa que remover a imagem enquanto o worker a converte descarta o job:
+    o resultado não é gravado de volta no usuário.
+    """
+    from images import image_job_model, image_worker
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id, image = _create_user_with_image(client, headers)
+
+    real_process = image_worker.process_image_base64
+    def process_and_clear(payload):
+        if payload == image:
+            clear_resp = client.put(f"/users/{user_id}", json={"profile_image_base64": None}, headers=headers)
+            assert clear_resp.json()["image_status"] == "none"
+        return real_process(payload)
+    monkeypatch.setattr(image_worker, "process_image_base64", process_and_clear)
+
+    job = _process_until_done(user_id)
+    assert job.status == image_job_model.SUPERSEDED
+    assert job.payload is None
+    user = client.get(f"/users/{user_id}", headers=headers).json()
+    assert user["image_status"] == "none"
+    assert user["profile_image_base64"] is None
+
+    client.delete(f"/users/{user_id}", headers=headers)
+
+def test_user_image_reserva_perdida(client, client_and_token, monkeypatch):
+    """
+    Testa que um worker que perdeu a reserva do job (outro worker o assumiu
+    depois de locked_until) não grava o resultado nem encerra o job.
+    """
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import update
+    from database import SessionLocal, unit_of_work
+    from images import image_job_model, image_job_repository, image_worker
+    from images.image_job_model import ImageJob
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id, image = _create_user_with_image(client, headers)
+
+    real_process = image_worker.process_image_base64
+    def process_and_lose_lease(payload):
+        if payload == image:
+            # Simula outro worker reservando o job depois que a reserva expirou
+            with SessionLocal() as db, unit_of_work(db):
+                db.execute(update(ImageJob)
+                           .where(ImageJob.user_id == user_id, ImageJob.status == image_job_model.RUNNING)
+                           .values(locked_until=datetime.now(timezone.utc) + timedelta(minutes=5)))
+        return real_process(payload)
+    monkeypatch.setattr(image_worker, "process_image_base64", process_and_lose_lease)
+
+    while client.get(f"/users/{user_id}/image-status", headers=headers).json()["image_status"] == "pending":
+        with SessionLocal() as db:
+            job = image_job_repository.get_latest_job(db, user_id)
+        if job.status == image_job_model.RUNNING:
+            break
+        assert image_worker.process_next_job(), "A fila esvaziou sem processar a imagem"
+
+    assert job.status == image_job_model.RUNNING
+    assert client.get(f"/users/{user_id}", headers=headers).json()["image_status"] == "pending"
+
+    client.delete(f"/users/{user_id}", headers=headers)
+
+def test_user_image_tentativas_esgotadas(client, client_and_token):
+    """
+    Testa que um job cuja reserva expirou na última tentativa (o worker caiu
+    processando a imagem) vai para dead sem rodar de novo, e o usuário fica
+    com image_status "failed".
+    """
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import update
+    from database import SessionLocal, unit_of_work
+    from images import image_job_model
+    from images.image_job_model import ImageJob
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id, _ = _create_user_with_image(client, headers)
+
+    # Simula cinco reservas que expiraram sem o worker terminar
+    with SessionLocal() as db, unit_of_work(db):
+        db.execute(update(ImageJob)
+                   .where(ImageJob.user_id == user_id)
+                   .values(status=image_job_model.RUNNING, attempts=5,
+                           locked_until=datetime.now(timezone.utc) - timedelta(seconds=1)))
+
+    job = _process_until_done(user_id)
+    assert job.status == image_job_model.DEAD
+    assert job.attempts == 5
+    assert job.payload is None
+    status_resp = client.get(f"/users/{user_id}/image-status", headers=headers).json()
+    assert status_resp["image_status"] == "failed"
+    assert status_resp["last_error"]
+
+    client.delete(f"/users/{user_id}", headers=headers)
+
+def test_user_msgpack(client, client_and_token):
+    """
+    Testa a negociação de conteúdo em MessagePack.
+
+    O usuário é criado com corpo MessagePack e a imagem em bytes crus; a
+    resposta volta em MessagePack e, depois de processada, a imagem também
+    volta em bytes (e como Data URL para quem pede JSON).
+    """
+    import msgpack
+    from images.image_worker import process_next_job
+    _, token = client_and_token
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/msgpack",
+        "Content-Type": "application/msgpack",
+    }
+    import io, random, string
+    from PIL import Image
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "blue").save(buffer, format="PNG")
+    image_bytes = buffer.getvalue()
+
+    roles_resp = client.get("/roles/", headers=headers)
+    assert roles_resp.headers["content-type"] == "application/msgpack"
+    role_id = msgpack.unpackb(roles_resp.content)[0]["id"]
+    user_resp = client.post("/users/", content=msgpack.packb({
+        "email": f"test_msgpack_user_{random_suffix}@example.com",
+        "password": "password123",
+        "role_id": role_id,
+        "profile_image_base64": image_bytes
+    }), headers=headers)
+    assert user_resp.status_code == 201, f"Falha ao criar usuário: {user_resp.text}"
+    assert user_resp.headers["content-type"] == "application/msgpack"
+    assert "Accept" in user_resp.headers["vary"]
+    user_id = msgpack.unpackb(user_resp.content)["id"]
+
+    def image_status():
+        return msgpack.unpackb(client.get(f"/users/{user_id}/image-status", headers=headers).content)["image_status"]
+
+    while image_status() == "pending":
+        assert process_next_job(), "A fila esvaziou sem processar a imagem"
+    user = msgpack.unpackb(client.get(f"/users/{user_id}", headers=headers).content)
+    assert user["profile_image_base64"] == image_bytes
+    json_user = client.get(f"/users/{user_id}", headers={"Authorization": f"Bearer {token}"}).json()
+    assert json_user["profile_image_base64"].startswith("data:image/png;base64,")
+
+    # A validação continua a mesma (e os erros continuam em JSON)
+    invalid = client.post("/users/", content=msgpack.packb({"email": "invalido"}), headers=headers)
+    assert invalid.status_code == 422
+    assert invalid.headers["content-type"] == "application/json"
+
+    client.delete(f"/users/{user_id}", headers=headers)
+
+def test_user_bulk(client, client_and_token):
+    """
+    Testa as operações em lote (/users/bulk).
+
+    O dry run só conta os usuários; o PATCH troca o perfil de todos com um
+    único UPDATE (movendo os contadores de membros) e o DELETE os exclui.
+    """
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    import random, string
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+    suffix = f"@bulk-{random_suffix}.example.com"
+
+    role_ids = [client.post("/roles/", json={"name": f"test_bulk_{name}_{random_suffix}"}, headers=headers).json()["id"]
+                for name in ("origem", "destino")]
+    user_ids = sorted(
+        client.post("/users/", json={"email": f"aluno{i}{suffix}", "password": "password123", "role_id": role_ids[0]},
+                    headers=headers).json()["id"]
+        for i in range(3)
+    )
+
+    dry_run = client.patch("/users/bulk", params={"dry_run": True}, json={
+        "filter": {"email_suffix": suffix}, "changes": {"role_id": role_ids[1]}
+    }, headers=headers)
+    assert dry_run.status_code == 200, f"Falha no dry run: {dry_run.text}"
+    assert dry_run.json() == {"dry_run": True, "count": 3, "ids": user_ids}
+    assert client.get(f"/users/{user_ids[0]}", headers=headers).json()["role"]["id"] == role_ids[0]
+
+    assert client.patch("/users/bulk", json={"filter": {}, "changes": {"role_id": role_ids[1]}},
+                        headers=headers).status_code == 422
+
+    patch = client.patch("/users/bulk", json={
+        "filter": {"email_suffix": suffix, "role_id": role_ids[0]}, "changes": {"role_id": role_ids[1]}
+    }, headers=headers)
+    assert patch.status_code == 200, f"Falha no PATCH em lote: {patch.text}"
+    assert patch.json() == {"dry_run": False, "count": 3, "ids": user_ids}
+    assert all(client.get(f"/users/{user_id}", headers=headers).json()["role"]["id"] == role_ids[1]
+               for user_id in user_ids)
+    counts = {role["id"]: role["member_count"] for role in client.get("/roles/stats", headers=headers).json()["roles"]}
+    assert counts[role_ids[0]] == 0 and counts[role_ids[1]] == 3
+
+    delete = client.request("DELETE", "/users/bulk", json={"ids": user_ids[:2]}, headers=headers)
+    assert delete.status_code == 200, f"Falha no DELETE em lote: {delete.text}"
+    assert delete.json()["ids"] == user_ids[:2]
+    assert client.get(f"/users/{user_ids[0]}", headers=headers).status_code == 404
+    delete = client.request("DELETE", "/users/bulk", json={"email_suffix": suffix}, headers=headers)
+    assert delete.json()["ids"] == user_ids[2:]
+
+    for role_id in role_ids:
+        assert client.delete(f"/roles/{role_id}", headers=headers).status_code == 200
+
+def test_single_flight_so_compartilha_2xx(client_and_token):
+    """
+    Testa que uma resposta de erro de quem executou (ex.: 403 do token dele)
+    não é repassada: quem esperava executa a própria requisição.
+    """
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi import FastAPI, HTTPException
+    from resilience.single_flight import SingleFlightMiddleware, SingleFlightStats
+    _, token = client_and_token
+
+    calls = []
+    lock = threading.Lock()
+    shared_app = FastAPI()
+
+    @shared_app.get("/shared", name="read_shared")
+    def read_shared():
+        with lock:
+            calls.append(None)
+            first = len(calls) == 1
+        time.sleep(0.5)
+        if first:
+            raise HTTPException(status_code=403, detail="Operation not permitted for this user role")
+        return {"ok": True}
+
+    shared_app.add_middleware(SingleFlightMiddleware, routes=["read_shared"], shared_routes=["read_shared"],
+                              stats=SingleFlightStats())
+
+    with TestClient(shared_app) as shared_client:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            responses = list(executor.map(
+                lambda _: shared_client.get("/shared", headers={"Authorization": f"Bearer {token}"}), range(3)))
+
+    assert sorted(response.status_code for response in responses) == [200, 200, 403]
+    assert len(calls) == 3
+
+def test_user_cache_de_principals(client, client_and_token):
+    """
+    Testa o cache de principals (usado com o banco fora): guarda só id,
+    e-mail e perfil do usuário autenticado; a troca de perfil e a exclusão,
+    individual ou em lote, tiram o usuário do cache.
+    """
+    from auth.auth_service import Principal, principal_cache
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    import random, string
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+
+    role = client.get("/roles/", headers=headers).json()[0]
+    emails = [f"test_principal_{i}_{random_suffix}@example.com" for i in range(2)]
+    user_ids = []
+    for email in emails:
+        user_resp = client.post("/users/", json={"email": email, "password": "password123", "role_id": role["id"]},
+                                headers=headers)
+        assert user_resp.status_code == 201, f"Falha ao criar usuário: {user_resp.text}"
+        user_ids.append(user_resp.json()["id"])
+        login = client.post("/auth/login", data={"username": email, "password": "password123"})
+        user_headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        assert client.get(f"/users/{user_ids[-1]}", headers=user_headers).status_code == 200
+
+    principal, _ = principal_cache.get(emails[0])
+    assert principal == Principal(id=user_ids[0], email=emails[0], role_name=role["name"])
+
+    # Troca de perfil em lote: o principal com o perfil anterior sai do cache
+    other_role_id = client.post("/roles/", json={"name": f"test_principal_{random_suffix}"}, headers=headers).json()["id"]
+    patch = client.patch("/users/bulk", json={"filter": {"ids": user_ids[:1]}, "changes": {"role_id": other_role_id}},
+                         headers=headers)
+    assert patch.status_code == 200, f"Falha no PATCH em lote: {patch.text}"
+    assert principal_cache.get(emails[0]) is None
+    assert principal_cache.get(emails[1]) is not None
+
+    assert client.delete(f"/users/{user_ids[0]}", headers=headers).status_code == 200
+    assert client.delete(f"/roles/{other_role_id}", headers=headers).status_code == 200
+    assert client.request("DELETE", "/users/bulk", json={"ids": user_ids[1:]}, headers=headers).status_code == 200
+    assert principal_cache.get(emails[1]) is None
+
+def test_user_listagem_single_flight(client, client_and_token, monkeypatch):
+    """
+    Testa o single-flight: listagens idênticas e simultâneas executam a
+    consulta uma única vez e todas recebem o mesmo corpo.
+    """
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from resilience.single_flight import single_flight_stats
+    from users import user_service
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+
+    calls = []
+    get_all_users = user_service.get_all_users
+
+    def slow_get_all_users(db):
+        calls.append(threading.get_ident())
+        time.sleep(0.5)
+        return get_all_users(db)
+
+    monkeypatch.setattr(user_service, "get_all_users", slow_get_all_users)
+    single_flight_stats.reset()
+
+    # Dentro do "with" todas as requisições rodam no mesmo event loop
+    with client:
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            responses = list(executor.map(lambda _: client.get("/users/", headers=headers), range(5)))
+
+        assert [response.status_code for response in responses] == [200] * 5
+        assert len({response.content for response in responses}) == 1
+        assert len(calls) == 1
+
+        stats = client.get("/admin/single-flight", headers=headers)
+        assert stats.status_code == 200
+        row = next(row for row in stats.json() if row["key"].startswith("GET /users/ "))
+        assert row["leaders"] == 1
+        assert row["followers"] == 4
+
+        # Sem outra execução em andamento, a próxima leitura executa sozinha
+        assert client.get("/users/", headers=headers).status_code == 200
+        assert len(calls) == 2
+        assert client.delete("/admin/single-flight", headers=headers).status_code == 204
+
+def test_single_flight_rota_por_usuario(client, client_and_token):
+    """
+    Testa o single-flight numa rota cuja resposta depende do usuário (fora de
+    `shared_routes`): dois usuários do mesmo perfil nunca recebem o corpo um
+    do outro, e requisições simultâneas do mesmo usuário ainda se juntam.
+    """
+    import threading
+    import time
+    import random, string
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi import Depends, FastAPI
+    from auth.auth_service import Principal, get_current_user
+    from resilience.single_flight import SingleFlightMiddleware, SingleFlightStats
+    _, token = client_and_token
+    headers = {"Authorization": f"Bearer {token}"}
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+
+    # Outro usuário com o mesmo perfil (mesma claim role no token)
+    admin_role = next(role for role in client.get("/roles/", headers=headers).json() if role["name"] == "admin")
+    email = f"test_single_flight_{random_suffix}@example.com"
+    user_resp = client.post("/users/", json={"email": email, "password": "password123", "role_id": admin_role["id"]},
+                            headers=headers)
+    assert user_resp.status_code == 201, f"Falha ao criar usuário: {user_resp.text}"
+    other_token = client.post("/auth/login", data={"username": email, "password": "password123"}).json()["access_token"]
+
+    calls = []
+    me_app = FastAPI()
+
+    @me_app.get("/me", name="read_me")
+    def read_me(current_user: Principal = Depends(get_current_user)):
+        calls.append(threading.get_ident())
+        time.sleep(0.5)
+        return {"email": current_user.email}
+
+    me_app.add_middleware(SingleFlightMiddleware, routes=["read_me"], shared_routes=[], stats=SingleFlightStats())
+
+    tokens = [token, other_token] * 2
+    with TestClient(me_app) as me_client:
+        with ThreadPoolExecutor(max_workers=len(tokens)) as executor:
+            responses = list(executor.map(
+                lambda user_token: me_client.get("/me", headers={"Authorization": f"Bearer {user_token}"}), tokens))
+
+    emails = [response.json()["email"] for response in responses]
+    assert emails == ["murilo.assis@ifg.edu.br", email] * 2
+    assert len(calls) == 2
+
+    client.delete(f"/users/{user_resp.json()['id']}", headers=headers)
@@ -0,0 +1,43 @@
+"""
+Worker da fila de imagens de perfil, para rodar separado da API:
+
+    python worker.py
+
+Use com IMAGE_WORKER_IN_PROCESS=false na API. Pode haver várias instâncias.
+"""
+import logging
+import os
+import signal
+import sys
+
+# Adiciona a pasta app ao Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from config import get_settings
+import database
+# Registra os modelos na Base antes do create_all (DEV)
+from users import user_model  # noqa: F401
+from roles import role_model  # noqa: F401
+from images.image_worker import ImageWorker
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+    database.init_engine(settings)
+    worker = ImageWorker(
+        lease_seconds=settings.image_job_lease_seconds,
+        max_attempts=settings.image_job_max_attempts,
+        backoff_seconds=settings.image_job_backoff_seconds,
+    )
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.start()
+    # join com timeout para que os sinais sejam tratados na thread principal
+    while worker.is_alive():
+        worker.join(timeout=1)
+    database.dispose_engine()
+
+
+if __name__ == '__main__':
+    main()